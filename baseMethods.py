@@ -4,6 +4,14 @@ import sys
 import yaml
 import numpy as np
 import pandas as pd
+import copy
+import shutil
+import pickle
+import hashlib
+import json
+import time
+import contextlib
+import tracemalloc
 import configparser
 from dataclasses import dataclass,field
 try:
@@ -21,6 +29,14 @@ except:
     from helperFunctions.log import log
     from helperFunctions.parseFrequency import parseFrequency
     
+# Process-wide caches: parsed variableMap YAML files and standardized variable maps keyed by header signature
+variableMapCache = {}
+schemaCache = {}
+# Parsed diagnostic bit tables keyed by (path, mtime)
+diagnosticCache = {}
+# Version of the parsers' output and of the parseCache entry layout, bump it when either changes so older entries miss
+parseCacheVersion = 1
+
 @dataclass(kw_only=True)
 class _metadata:
     northOffset: float = None
@@ -44,6 +60,8 @@ class _variableMap:
     dtype: str = None
     dateRange: list = None
     variableDescription: str = None
+    # Named bits of a packed diagnostic column, {flag: bit value}
+    flags: dict = None
     verbose: bool = field(default=False,repr=False)
     dropCols: list = field(default_factory=lambda:[],repr=False)
 
@@ -59,7 +77,8 @@ class _variableMap:
                 else:
                     self.dtype = np.dtype(self.dtype)
                 if not self.ignore:
-                    self.ignore = not np.issubdtype(self.dtype,np.number)
+                    # Decoded diagnostic flags (bool) are kept along with the numeric columns
+                    self.ignore = not (np.issubdtype(self.dtype,np.number) or self.dtype.kind == 'b')
             if self.dtype:
                 self.dtype = self.dtype.str
             if self.variableName == self.fillChar*len(self.variableName):
@@ -68,7 +87,133 @@ class _variableMap:
                 print(['Re-named: ',self.title,' to: ',self.variableName])
             if self.title in self.dropCols or self.variableName in self.dropCols:
                 self.ignore = True
+
+    def asdict(self):
+        # Entry as stored in the variableMap, flags only where they are set (packed diagnostic columns)
+        entry = asdict_repr(self)
+        if self.flags is None:
+            entry.pop('flags',None)
+        return(entry)
         
+@dataclass(kw_only=True)
+class instrument:
+    # Structured per-stage records from the parsers and binBundle: wall time, bytes and rows in, optional tracemalloc peak
+    # sink: None keeps the records in self.records, a str appends them as JSON lines to that file, a callable receives each record
+    # context is added to every record (e.g. {'station':'BB'}), use a file sink when parsing in worker processes
+    sink: object = None
+    traceMemory: bool = False
+    context: dict = field(default_factory=lambda:{})
+    records: list = field(default_factory=lambda:[],repr=False)
+
+    def __post_init__(self):
+        self.stack = []
+
+    @contextlib.contextmanager
+    def stage(self,name,**kwds):
+        # Time the body of a with block, the yielded dict can be updated with bytes/rows known only at the end
+        record = self.context|{'stage':name}|kwds
+        if self.traceMemory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                record['_started'] = True
+            current,peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                # Keep the enclosing stage's peak before resetting it for this one
+                self.stack[-1]['_peak'] = max(self.stack[-1].get('_peak',0),peak)
+            tracemalloc.reset_peak()
+            record['_base'] = current
+        self.stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter()-start
+            self.stack.pop()
+            if self.traceMemory:
+                peak = max(tracemalloc.get_traced_memory()[1],record.pop('_peak',0))
+                record['peak_bytes'] = peak-record.pop('_base')
+                if self.stack:
+                    self.stack[-1]['_peak'] = max(self.stack[-1].get('_peak',0),peak)
+                if record.pop('_started',False):
+                    tracemalloc.stop()
+            record['time'] = time.time()
+            self.emit(record)
+
+    def emit(self,record):
+        if self.sink is None:
+            self.records.append(record)
+        elif callable(self.sink):
+            self.sink(record)
+        else:
+            with open(self.sink,'a') as f:
+                f.write(json.dumps(record,default=str)+'\n')
+
+    def summary(self):
+        # Total seconds, bytes and rows per stage of the in-memory records
+        if not self.records:
+            return(pd.DataFrame())
+        return(pd.DataFrame(self.records).groupby('stage',sort=False).sum(numeric_only=True).drop(columns=['time'],errors='ignore'))
+
+@dataclass(kw_only=True)
+class diagnosticTable:
+    # Named bits of an instrument's diagnostic word, read from a csv with Diagnostics (flag name), Integer (bit value) and Meaning columns
+    # table is a path or the name of a csv in config_files, e.g. 'LI7700_diag', other instruments (sonic_diag, irga_diag) just need their own csv
+    table: str = 'LI7700_diag'
+    flags: dict = field(default_factory=lambda:{},repr=False)
+    meanings: dict = field(default_factory=lambda:{},repr=False)
+
+    def __post_init__(self):
+        path = self.table
+        if not os.path.isfile(path):
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)),'config_files',f'{self.table}.csv')
+        key = (os.path.abspath(path),os.path.getmtime(path))
+        if key not in diagnosticCache:
+            diagnosticCache[key] = pd.read_csv(path,skipinitialspace=True)
+        table = diagnosticCache[key]
+        self.flags = {name:int(bit) for name,bit in zip(table['Diagnostics'],table['Integer'])}
+        self.meanings = dict(zip(table['Diagnostics'],table['Meaning']))
+        self.bits = int(np.bitwise_or.reduce(list(self.flags.values())))
+        self.masks = np.array(list(self.flags.values()),dtype=np.int64)
+        # Narrowest unsigned integer holding the instrument's bits, e.g. uint16 for the LI-7700
+        self.dtype = np.min_scalar_type(self.bits)
+        # A missing diagnostic value is not a bit of the word, it is carried as its own bool column
+        self.names = list(self.flags)+['MISSING']
+        self.meanings['MISSING'] = 'Diagnostic value missing'
+
+    @staticmethod
+    def values(series):
+        # Raw values of a diagnostic column, NA of nullable integer columns as NaN
+        # Float columns are not cast, so signalling NaNs (e.g. from IEEE4B fields) are only ever tested, never converted
+        if isinstance(series.dtype,np.dtype):
+            return(series.to_numpy())
+        return(series.to_numpy(dtype=np.float64,na_value=np.nan))
+
+    def words(self,values):
+        # Diagnostic values as int64 words of the instrument's bits (0 where missing) and where they are missing (NaN)
+        values = np.asarray(values)
+        if values.dtype.kind in 'biu':
+            return(values.astype(np.int64)&self.bits,np.zeros(values.shape[0],dtype=bool))
+        missing = ~np.isfinite(values)
+        return(np.where(missing,0,values).astype(np.int64)&self.bits,missing)
+
+    def pack(self,values):
+        word,missing = self.words(values)
+        return(word.astype(self.dtype),missing)
+
+    def decode(self,values):
+        # Boolean matrix (records x names) of the bits set in each diagnostic word, and MISSING
+        word,missing = self.words(values)
+        return(np.concatenate([(word[:,None]&self.masks) != 0,missing[:,None]],axis=1))
+
+    def counts(self,values,starts):
+        # Records with each flag set (and missing), per contiguous block of records beginning at starts
+        return(np.add.reduceat(self.decode(values),starts,axis=0).astype(np.int64))
+
+@contextlib.contextmanager
+def nullStage():
+    # Stand-in stage when instrumentation is off, a fresh record per use so nothing written to it is shared
+    yield({})
+
 @dataclass(kw_only=True)
 class genericLoggerFile(_metadata):
     # Important attributes to be associated with a generic logger file
@@ -85,16 +230,132 @@ class genericLoggerFile(_metadata):
     verbose: bool = field(default=False,repr=False)
     binZip: bool = field(default=False,repr=False)
     dropCols: list = field(default_factory=lambda:[],repr=False)
+    instrument: instrument = field(default=None,repr=False)
+    # extract=False is a header-only pass: DataFrame holds just the first and last records
+    extract: bool = True
+    startTime: pd.Timestamp = field(default=None,repr=False)
+    endTime: pd.Timestamp = field(default=None,repr=False)
+    # Diagnostic columns to decode into named flags: {column title: diagnosticTable or the name/path of its csv}
+    # each becomes one bool column per flag, or with packFlags=True stays a single packed unsigned integer column
+    diagnostics: dict = field(default_factory=lambda:{},repr=False)
+    packFlags: bool = field(default=False,repr=False)
+    # compact=True keeps the parsed data in the narrowest dtypes: float32 measurements (float64 only where the source declares 8 bytes),
+    # uint32 RECORD, int32 integer channels, int64 epoch nanosecond timestamps and (with packFlags) packed unsigned diagnostic words
+    compact: bool = field(default=False,repr=False)
 
     def __post_init__(self):
+        self.diagnostics = {column:table if isinstance(table,diagnosticTable) else diagnosticTable(table=table) for column,table in self.diagnostics.items()}
+        if self.compact and self.timestampUnits == self.__dataclass_fields__['timestampUnits'].default:
+            self.timestampUnits = 'POSIX time (nanoseconds elapsed since 1970-01-01T00:00:00Z)'
         if type(self.variableMap) is str and os.path.isfile(self.variableMap):
-            self.variableMap = loadDict(self.variableMap)
+            # Reuse the parsed YAML while the file is unchanged
+            key = (os.path.abspath(self.variableMap),os.path.getmtime(self.variableMap))
+            if key not in variableMapCache:
+                variableMapCache[key] = loadDict(self.variableMap)
+            self.variableMap = copy.deepcopy(variableMapCache[key])
         pass
 
+    def stage(self,name,**kwds):
+        # Context manager timing one pipeline stage of this file, a no-op unless an instrument is attached
+        if self.instrument is None:
+            return(nullStage())
+        return(self.instrument.stage(name,file=self.sourceFile,parser=self.__class__.__name__,**kwds))
+
     def standardize(self):
+        with self.stage('standardize',rows=self.DataFrame.shape[0]):
+            if self.compact:
+                self.DataFrame = self.compactTypes(self.DataFrame)
+            if len(self.diagnostics) > 0:
+                self.DataFrame = self.expandFlags(self.DataFrame)
+                self.flagMap()
+            if self.compact:
+                # Record the chosen dtypes over the declared ones
+                for column,dtype in self.DataFrame.dtypes.items():
+                    self.variableMap[column] = self.variableMap.get(column,{})|{'dtype':dtype.str}
+            self.standardizeColumns()
+
+    def processChunk(self,DataFrame):
+        # The standardize() conversions (compact dtypes, diagnostic flags) for data read after it, e.g. by iter_chunks
+        if self.compact:
+            DataFrame = self.compactTypes(DataFrame)
+        return(self.expandFlags(DataFrame))
+
+    def compactTypes(self,DataFrame):
+        # Narrow the 8-byte columns, integers only when every value fits, and keep the timestamps as epoch nanoseconds
+        if isinstance(DataFrame.index,pd.DatetimeIndex) and DataFrame.index.unit != 'ns':
+            DataFrame = DataFrame.set_axis(DataFrame.index.as_unit('ns'),axis=0)
+        casts = {}
+        for column,dtype in DataFrame.dtypes.items():
+            if column == self.timestampName or not isinstance(dtype,np.dtype) or dtype.itemsize < 8:
+                continue
+            if dtype.kind == 'f' and column != 'RECORD':
+                declared = self.variableMap.get(column,{}).get('dtype')
+                if declared is None or np.dtype(_variableMap.dtype_map_numpy.get(declared,declared)).itemsize < 8:
+                    casts[column] = np.float32
+            elif dtype.kind in 'iu':
+                target = np.dtype(np.uint32 if column == 'RECORD' else np.int32)
+                values = DataFrame[column].to_numpy()
+                if values.shape[0] == 0 or (values.min() >= np.iinfo(target).min and values.max() <= np.iinfo(target).max):
+                    casts[column] = target
+        if len(casts) == 0:
+            return(DataFrame)
+        return(DataFrame.astype(casts))
+
+    def expandFlags(self,DataFrame):
+        # Decode the diagnostic columns of a DataFrame (or chunk) with vectorized bitwise tests
+        for column,table in self.diagnostics.items():
+            if column not in DataFrame.columns:
+                continue
+            values = table.values(DataFrame[column])
+            if self.packFlags:
+                word,missing = table.pack(values)
+                DataFrame = DataFrame.assign(**{column:word,f'{column}_MISSING':missing})
+            else:
+                flags = pd.DataFrame(table.decode(values),index=DataFrame.index,columns=[f'{column}_{flag}' for flag in table.names])
+                DataFrame = pd.concat([DataFrame,flags],axis=1)
+        return(DataFrame)
+
+    def flagMap(self):
+        # Describe the decoded flags in the variableMap, user entries take precedence
+        for column,table in self.diagnostics.items():
+            if column not in self.DataFrame.columns:
+                continue
+            if self.packFlags:
+                # The header's storage type no longer applies to the packed column
+                self.variableMap[column] = {'title':column,'flags':dict(table.flags)}|self.variableMap.get(column,{})|{'dtype':table.dtype.str}
+                name = f'{column}_MISSING'
+                self.variableMap[name] = {'title':name,'variableDescription':table.meanings['MISSING']}|self.variableMap.get(name,{})
+            else:
+                for flag in table.names:
+                    name = f'{column}_{flag}'
+                    self.variableMap[name] = {'title':name,'variableDescription':table.meanings[flag]}|self.variableMap.get(name,{})
+
+    def standardizeColumns(self):
         # Create the template column map, fill column dtype where not present 
         if self.fileType is None:
             self.fileType=self.__class__.__name__
+        # Files with the same header, user map, dropCols and map-changing options give the same standardized map, build it once per process
+        self.schemaKey = (self.__class__.__name__,self.fileType,self.timestampName,self.timestampUnits,
+            tuple((key,str(dtype)) for key,dtype in self.DataFrame.dtypes.items()),
+            repr(self.variableMap),tuple(self.dropCols),self.compact,self.packFlags,
+            tuple((column,table.table,tuple(table.flags.items())) for column,table in self.diagnostics.items()))
+        if self.schemaKey in schemaCache:
+            self.variableMap = {key:dict(var) for key,var in schemaCache[self.schemaKey]['variableMap'].items()}
+        else:
+            self.buildVariableMap()
+            schemaCache[self.schemaKey] = {
+                'variableMap':{key:dict(var) for key,var in self.variableMap.items()},
+                'safeMap':{val['title']:variableName for variableName,val in self.variableMap.items()}
+                }
+        if self.frequency is None:
+            if isinstance(self.DataFrame.index, pd.DatetimeIndex) and self.DataFrame.index.shape[0]>1:
+                self.frequency=f"{np.quantile(self.DataFrame.index.diff().total_seconds().dropna().values,.25)}s"
+        if self.fileTimestamp != self.__dataclass_fields__['fileTimestamp'].default:
+            self.fileTimestamp = self.fileTimestamp.strftime(format=self.__dataclass_fields__['fileTimestamp'].default)
+        if self.binZip:
+            print('call')
+
+    def buildVariableMap(self):
         self.variableMap = updateDict(
             {key:{
                 'dtype':self.DataFrame[key].dtype,'title':key}|self.variableMap[key] 
@@ -102,21 +363,179 @@ class genericLoggerFile(_metadata):
                 {'dtype':self.DataFrame[key].dtype,'title':key} 
                 for key in self.DataFrame.columns},self.variableMap#,overwrite=overwrite
         )
-        self.variableMap[self.timestampName]['dtype'] = 'float64'
+        # The timestamp is the index, not a column, so its entry may only come from the header
+        self.variableMap[self.timestampName] = {'title':self.timestampName}|self.variableMap.get(self.timestampName,{})
+        self.variableMap[self.timestampName]['dtype'] = 'int64' if self.compact else 'float64'
         self.variableMap[self.timestampName]['units'] = self.timestampUnits
-        self.variableMap = {var.variableName:asdict_repr(var) for var in map(lambda name: _variableMap(dropCols=self.dropCols,**self.variableMap[name]),self.variableMap.keys())}
-        if self.frequency is None:
-            if isinstance(self.DataFrame.index, pd.DatetimeIndex) and self.DataFrame.index.shape[0]>0:
-                self.frequency=f"{np.quantile(self.DataFrame.index.diff().total_seconds().dropna().values,.25)}s"
-        if self.fileTimestamp != self.__dataclass_fields__['fileTimestamp'].default:
-            self.fileTimestamp = self.fileTimestamp.strftime(format=self.__dataclass_fields__['fileTimestamp'].default)
-        if self.binZip:
-            print('call')
+        if self.compact and self.timestampUnits == self.__dataclass_fields__['timestampUnits'].default:
+            self.variableMap[self.timestampName]['units'] = self.timestampUnits.replace('(seconds','(nanoseconds')
+        self.variableMap = {var.variableName:var.asdict() for var in map(lambda name: _variableMap(dropCols=self.dropCols,**self.variableMap[name]),self.variableMap.keys())}
 
     def applyvariableNames(self):
-        self.safeMap = {val['title']:variableName for variableName,val in self.variableMap.items()}
+        if getattr(self,'schemaKey',None) in schemaCache:
+            self.safeMap = dict(schemaCache[self.schemaKey]['safeMap'])
+        else:
+            self.safeMap = {val['title']:variableName for variableName,val in self.variableMap.items()}
         self.backMap = {variableName:title for title,variableName in self.safeMap.items()}
-        self.DataFrame = self.DataFrame.rename(columns=self.safeMap)
+        with self.stage('rename',rows=self.DataFrame.shape[0]):
+            self.DataFrame = self.DataFrame.rename(columns=self.safeMap)
+
+    def timeSpan(self):
+        # First and last timestamps of the parsed records
+        if isinstance(self.DataFrame.index,pd.DatetimeIndex) and self.DataFrame.shape[0]>0:
+            self.startTime,self.endTime = self.DataFrame.index.min(),self.DataFrame.index.max()
+        return(self.startTime,self.endTime)
+
+    def inventory(self):
+        # One row describing this file for an archive inventory
+        self.timeSpan()
+        RECORD = self.DataFrame['RECORD'] if 'RECORD' in self.DataFrame.columns and self.DataFrame.shape[0] > 0 else None
+        return({
+            'sourceFile':self.sourceFile,
+            'fileType':self.fileType,
+            'StationName':getattr(self,'StationName',None),
+            'LoggerModel':getattr(self,'LoggerModel',None),
+            'SerialNo':getattr(self,'SerialNo',None),
+            'program':getattr(self,'program',None),
+            'Table':getattr(self,'Table',None),
+            'frequency':self.frequency,
+            'startTime':self.startTime,
+            'endTime':self.endTime,
+            'variables':len(self.variableMap),
+            'bytes':os.path.getsize(self.sourceFile),
+            'firstRecord':None if RECORD is None else int(RECORD.iloc[0]),
+            'lastRecord':None if RECORD is None else int(RECORD.iloc[-1]),
+            # Header-only passes don't know the row count
+            'rows':self.DataFrame.shape[0] if self.extract else None,
+            })
+
+    @classmethod
+    def fromCache(cls,cache,**kwds):
+        # Parse through a parseCache: a cache hit skips parsing entirely
+        return(cache.load(cls,**kwds))
+
+@dataclass(kw_only=True)
+class parseCache:
+    # On-disk cache of parsed logger files, one directory per entry:
+    # each DataFrame column and the index as .npy (numeric columns memory-mapped on load), everything else pickled in meta.pkl
+    # Entries are keyed by source file identity (path, size, mtime and optionally a content hash),
+    # the parser class, its parameters, the effective variableMap/dropCols and parseCacheVersion
+    cacheDir: str
+    maxBytes: int = 2**32
+    hashContents: bool = False
+    verbose: bool = field(default=False,repr=False)
+
+    def __post_init__(self):
+        os.makedirs(self.cacheDir,exist_ok=True)
+
+    def key(self,parser,kwds):
+        sourceFile = os.path.abspath(kwds['sourceFile'])
+        stat = os.stat(sourceFile)
+        identity = [sourceFile,stat.st_size,stat.st_mtime_ns]
+        if self.hashContents:
+            sha = hashlib.sha1()
+            with open(sourceFile,'rb') as f:
+                for block in iter(lambda: f.read(2**20),b''):
+                    sha.update(block)
+            identity.append(sha.hexdigest())
+        variableMap = kwds.get('variableMap',{})
+        if type(variableMap) is str and os.path.isfile(variableMap):
+            variableMap = loadDict(variableMap)
+        params = sorted((k,repr(v)) for k,v in kwds.items() if k not in ['sourceFile','variableMap','dropCols','instrument'])
+        signature = repr([parseCacheVersion,identity,parser.__module__,parser.__qualname__,params,variableMap,kwds.get('dropCols',[])])
+        return(hashlib.sha1(signature.encode()).hexdigest())
+
+    def load(self,parser,**kwds):
+        entry = os.path.join(self.cacheDir,self.key(parser,kwds))
+        if os.path.isfile(os.path.join(entry,'meta.pkl')):
+            log(f"Cache hit for {kwds['sourceFile']}",verbose=self.verbose)
+            # Touch the entry, eviction is least recently used first
+            os.utime(os.path.join(entry,'meta.pkl'))
+            tracker = kwds.get('instrument')
+            try:
+                with (nullStage() if tracker is None else tracker.stage('cacheRead',file=kwds['sourceFile'],parser=parser.__name__)) as record:
+                    parsed = self.read(parser,entry)
+                    record['rows'] = parsed.DataFrame.shape[0]
+                parsed.instrument = tracker
+                return(parsed)
+            except Exception as e:
+                # An unreadable entry is dropped and the file parsed again
+                log(f"Discarding unreadable cache entry for {kwds['sourceFile']}: {e}",verbose=self.verbose)
+                shutil.rmtree(entry,ignore_errors=True)
+        parsed = parser(**kwds)
+        self.write(parsed,entry)
+        self.evict()
+        return(parsed)
+
+    def write(self,parsed,entry):
+        temp = f"{entry}.tmp{os.getpid()}"
+        os.makedirs(temp,exist_ok=True)
+        DataFrame = parsed.DataFrame
+        for i,column in enumerate(DataFrame.columns):
+            np.save(os.path.join(temp,f"{i}.npy"),DataFrame[column].values,allow_pickle=True)
+        np.save(os.path.join(temp,'index.npy'),DataFrame.index.values,allow_pickle=True)
+        attrs = {k:v for k,v in parsed.__dict__.items() if k not in ['DataFrame','fileObject','instrument']}
+        with open(os.path.join(temp,'meta.pkl'),'wb') as f:
+            pickle.dump({'version':parseCacheVersion,'attrs':attrs,'columns':list(DataFrame.columns),'dtypes':list(DataFrame.dtypes),'indexName':DataFrame.index.name,
+                         'sourceFile':os.path.abspath(parsed.sourceFile)},f)
+        shutil.rmtree(entry,ignore_errors=True)
+        os.replace(temp,entry)
+
+    def read(self,parser,entry):
+        with open(os.path.join(entry,'meta.pkl'),'rb') as f:
+            meta = pickle.load(f)
+        if meta.get('version') != parseCacheVersion:
+            raise ValueError(f"cache entry version {meta.get('version')} is not {parseCacheVersion}")
+        parsed = parser.__new__(parser)
+        parsed.__dict__.update(meta['attrs'])
+        parsed.fileObject = None
+        columns = {}
+        for i,column in enumerate(meta['columns']):
+            columns[column] = self.loadColumn(os.path.join(entry,f"{i}.npy"))
+        index = np.load(os.path.join(entry,'index.npy'),allow_pickle=True)
+        parsed.DataFrame = pd.DataFrame(columns,index=pd.Index(index,name=meta['indexName']),copy=False)
+        # Object columns come back as inferred (e.g. str) dtypes, restore the parsed ones
+        changed = {column:dtype for column,dtype in zip(meta['columns'],meta.get('dtypes',[])) if parsed.DataFrame[column].dtype != dtype}
+        if changed:
+            parsed.DataFrame = parsed.DataFrame.astype(changed)
+        return(parsed)
+
+    def loadColumn(self,fn):
+        # Numeric columns are memory-mapped, object (string) columns can't be and are unpickled instead
+        with open(fn,'rb') as f:
+            version = np.lib.format.read_magic(f)
+            dtype = np.lib.format.read_array_header_1_0(f)[2] if version == (1,0) else np.lib.format.read_array_header_2_0(f)[2]
+        if dtype.hasobject:
+            return(np.load(fn,allow_pickle=True))
+        return(np.asarray(np.load(fn,mmap_mode='r')))
+
+    def entries(self):
+        # Cache entries with their size and last use, least recently used first
+        entries = []
+        for name in os.listdir(self.cacheDir):
+            meta = os.path.join(self.cacheDir,name,'meta.pkl')
+            if os.path.isfile(meta):
+                size = sum(os.path.getsize(os.path.join(self.cacheDir,name,f)) for f in os.listdir(os.path.join(self.cacheDir,name)))
+                entries.append((os.path.getmtime(meta),size,os.path.join(self.cacheDir,name)))
+        return(sorted(entries))
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _,size,_ in entries)
+        for _,size,entry in entries:
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(entry,ignore_errors=True)
+            total -= size
+
+    def invalidate(self,sourceFile=None):
+        # Drop the entries of one source file, or the whole cache
+        for _,_,entry in self.entries():
+            if sourceFile is not None:
+                with open(os.path.join(entry,'meta.pkl'),'rb') as f:
+                    if pickle.load(f)['sourceFile'] != os.path.abspath(sourceFile):
+                        continue
+            shutil.rmtree(entry,ignore_errors=True)
 
 @dataclass
 class template(genericLoggerFile):
@@ -131,15 +550,51 @@ class template(genericLoggerFile):
         with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),'templates','templateInputs.yml'),'w+') as f:
             yaml.safe_dump(asdict_repr(self),f,sort_keys=False)
           
+def headLines(fileObject,n=1):
+    # The next n lines of an open file
+    lines = []
+    for line in fileObject:
+        lines.append(line)
+        if len(lines) == n:
+            break
+    return(lines)
+
+def tailLines(sourceFile,n=1,blockSize=2**16,end=None):
+    # The last n complete lines (bytes) of a file (or of its first end bytes), read backwards in blocks, a half-written last line is left out
+    with open(sourceFile,'rb') as f:
+        position = f.seek(0,os.SEEK_END) if end is None else end
+        data = b''
+        while position > 0 and data.count(b'\n') <= n:
+            start = max(position-blockSize,0)
+            f.seek(start)
+            data = f.read(position-start)+data
+            position = start
+    lines = data[:data.rfind(b'\n')+1].splitlines(keepends=True)
+    if position > 0:
+        # The first line is only a fragment
+        lines = lines[1:]
+    return(lines[-n:] if n > 0 else [])
+
+def binExtension(dtype):
+    # File extension for a raw column file of the given dtype: .ecf32, .ecf64, .eci32, .ecu16, ...
+    dtype = np.dtype(dtype)
+    return(f'.ec{dtype.kind}{dtype.itemsize*8}')
+
 @dataclass(kw_only=True)
 class binBundle:
+    # Writes a DataFrame as raw binary: timestamps (.tsf64, POSIX seconds), column-major blocks of data 
+    # with one file per dtype (.ecf32, .ecf64, .eci32, ...) and a .metadata YAML with the variableMap of the stored columns
+    # The '_bundle' entry of the .metadata records the row count, which columns are in which file and the byte offset of each block
+    # Chunks can be added with write() (or append=True to extend an existing bundle), memory use is bounded by the chunk size
     variableMap:str = None
     DataFrame:pd.DataFrame = None
     filename:str = None
     Metadata: configparser.ConfigParser = field(default_factory=lambda:configparser.ConfigParser())
     outputPath: str = None
-    dtype: str = 'float32'
+    dtype: str = None
+    append: bool = False
     verbose: bool = True
+    instrument: instrument = field(default=None,repr=False)
 
     def __post_init__(self):
         self.templateMD = configparser.ConfigParser()
@@ -147,30 +602,137 @@ class binBundle:
         self.templateMD={sec:{key:value for key,value in self.templateMD[sec].items()} for sec in self.templateMD.sections()}
         for key in self.templateMD:
             self.Metadata.add_section(key)
+        self.layout = {'rows':0,'files':{},'blocks':[]}
+        fn = os.path.join(self.outputPath,f'{self.filename}.metadata')
+        if self.append and os.path.isfile(fn):
+            with open(fn) as f:
+                metadata = yaml.safe_load(f)
+            self.layout = metadata.pop('_bundle')
+            self.variableMap = metadata|{col:md for col,md in self.variableMap.items() if col not in metadata}
+        else:
+            for ext in ['.metadata','.tsf64']+[binExtension(d) for d in ['f4','f8','i1','i2','i4','i8','u1','u2','u4','u8','b1']]:
+                if os.path.isfile(os.path.join(self.outputPath,f'{self.filename}{ext}')):
+                    os.remove(os.path.join(self.outputPath,f'{self.filename}{ext}'))
+        if self.DataFrame is not None:
+            self.write(self.DataFrame)
 
-        # keep = [col for col,md in self.variableMap.items() if not md['ignore']]
-        keep = self.find_f32()
-        self.bundleOut = {
-            f'{self.filename}.metadata':{col:self.variableMap[col] for col in keep},
-            f'{self.filename}.tsf64':self.DataFrame.index.values.astype(np.float64)/10**9,
-            f'{self.filename}.ecf32':self.DataFrame[keep].values.T.flatten().astype('float32')
-        }
-        fn = f'{self.filename}.metadata'
-        f = os.path.join(self.outputPath,fn)
-        with open(f,'w') as out:
-            yaml.safe_dump(self.bundleOut[fn],out,sort_keys=False)
-        fn = f'{self.filename}.tsf64'
-        f = os.path.join(self.outputPath,fn)
-        self.bundleOut[fn].tofile(f)
-        fn = f'{self.filename}.ecf32'
-        f = os.path.join(self.outputPath,fn)
-        self.bundleOut[fn].tofile(f)
+    def write(self,DataFrame):
+        if self.instrument is None:
+            return(self.writeBlock(DataFrame))
+        with self.instrument.stage('binBundle',file=self.filename,rows=DataFrame.shape[0]) as record:
+            record['bytes'] = self.writeBlock(DataFrame)
 
-        
-    def find_f32(self):
-        log('Restricting to f32, remember to implement fix elsewhere in toolchain so this is not needed in the future',verbose=self.verbose)
-        cols = []
+    def writeBlock(self,DataFrame):
+        # Append one chunk, column by column (no transposed copy of the chunk), returns the bytes written
+        if len(self.layout['files']) == 0:
+            self.layout['files'] = self.find_columns()
+        block = {'rows':DataFrame.shape[0],'offsets':{}}
+        for ext,cols in self.layout['files'].items():
+            fn = os.path.join(self.outputPath,f'{self.filename}{ext}')
+            block['offsets'][ext] = os.path.getsize(fn) if os.path.isfile(fn) else 0
+            with open(fn,'ab') as f:
+                for col in cols:
+                    np.ascontiguousarray(DataFrame[col].to_numpy(dtype=self.storedType(col))).tofile(f)
+        with open(os.path.join(self.outputPath,f'{self.filename}.tsf64'),'ab') as f:
+            (DataFrame.index.values.astype('datetime64[ns]').astype(np.int64)/10**9).tofile(f)
+        self.layout['rows'] += block['rows']
+        self.layout['blocks'].append(block)
+        self.writeMetadata()
+        return(block['rows']*(8+sum(self.storedType(col).itemsize for cols in self.layout['files'].values() for col in cols)))
+
+    def writeMetadata(self):
+        fn = os.path.join(self.outputPath,f'{self.filename}.metadata')
+        metadata = {col:self.variableMap[col] for cols in self.layout['files'].values() for col in cols}
+        with open(fn,'w') as out:
+            yaml.safe_dump(metadata|{'_bundle':self.layout},out,sort_keys=False)
+
+    def storedType(self,col):
+        if self.dtype is not None:
+            return(np.dtype(self.dtype))
+        return(np.dtype(self.variableMap[col]['dtype']).newbyteorder('<'))
+
+    def find_columns(self):
+        # Group the numeric (and bool flag), non-ignored columns by the file they are stored in
+        files = {}
         for c,m in self.variableMap.items():
-            if m['dtype'] == '<f4' and not m['ignore']:
-                cols.append(c)
-        return(cols)
\ No newline at end of file
+            if m['ignore'] or m['dtype'] is None or c == '_bundle':
+                continue
+            if np.issubdtype(np.dtype(m['dtype']),np.number) or np.dtype(m['dtype']).kind == 'b':
+                files.setdefault(binExtension(self.storedType(c)),[]).append(c)
+        return(files)
+
+    def find_f32(self):
+        return(self.find_columns().get(binExtension('float32'),[]))
+
+@dataclass(kw_only=True)
+class binBundleReader:
+    # Reads a bundle written by binBundle: the .tsf64 and column files are memory-mapped 
+    # and each variable is served as a lazy view, time ranges are located by binary search on the timestamps
+    filename: str
+    outputPath: str = '.'
+    variableMap: dict = field(default_factory=lambda:{},repr=False)
+
+    def __post_init__(self):
+        with open(os.path.join(self.outputPath,f'{self.filename}.metadata')) as f:
+            self.variableMap = yaml.safe_load(f)
+        self.Timestamp = self.memmap('.tsf64',np.dtype('<f8'))
+        self.layout = self.variableMap.pop('_bundle',None)
+        if self.layout is None:
+            # Bundles written before multi-dtype support: one float32 block with the columns in .metadata order
+            self.layout = {'rows':self.Timestamp.shape[0],'files':{'.ecf32':list(self.variableMap.keys())},
+                           'blocks':[{'rows':self.Timestamp.shape[0],'offsets':{'.ecf32':0}}]}
+        self.columns = {col:ext for ext,cols in self.layout['files'].items() for col in cols}
+        self.data = {ext:self.memmap(ext,np.dtype(f'<{ext[3]}{int(ext[4:])//8}')) for ext in self.layout['files']}
+
+    def memmap(self,ext,dtype):
+        fn = os.path.join(self.outputPath,f'{self.filename}{ext}')
+        if os.path.getsize(fn) == 0:
+            return(np.zeros(0,dtype=dtype))
+        return(np.memmap(fn,dtype=dtype,mode='r'))
+
+    def __getitem__(self,name):
+        return(self.column(name))
+
+    def rowRange(self,start=None,end=None):
+        # Rows between start and end (inclusive), as POSIX seconds or anything pandas can parse as a timestamp
+        toPOSIX = lambda t: float(t) if isinstance(t,(int,float,np.number)) else pd.Timestamp(t).timestamp()
+        first = 0 if start is None else int(np.searchsorted(self.Timestamp,toPOSIX(start),side='left'))
+        last = self.layout['rows'] if end is None else int(np.searchsorted(self.Timestamp,toPOSIX(end),side='right'))
+        return(first,last)
+
+    def column(self,name,start=None,end=None):
+        # Zero-copy view of one variable when the rows come from a single block, otherwise the blocks are concatenated
+        return(self.columnRows(name,*self.rowRange(start,end)))
+
+    def columnRows(self,name,first,last):
+        # One variable over rows [first, last)
+        ext = self.columns[name]
+        position = self.layout['files'][ext].index(name)
+        pieces,row = [],0
+        for block in self.layout['blocks']:
+            lo,hi = max(first-row,0),min(last-row,block['rows'])
+            if lo < hi:
+                begin = block['offsets'][ext]//self.data[ext].itemsize+position*block['rows']
+                pieces.append(self.data[ext][begin+lo:begin+hi])
+            row += block['rows']
+        if len(pieces) == 1:
+            return(pieces[0])
+        if len(pieces) == 0:
+            return(np.zeros(0,dtype=self.data[ext].dtype))
+        return(np.concatenate(pieces))
+
+    def toDataFrame(self,columns=None,start=None,end=None):
+        # Materialize only the requested columns (all by default) over [start, end]
+        return(self.frameRows(columns,*self.rowRange(start,end)))
+
+    def frameRows(self,columns,first,last):
+        if columns is None:
+            columns = list(self.columns.keys())
+        # float64 seconds only resolve ~100 ns at present-day epochs
+        index = pd.to_datetime(self.Timestamp[first:last]*10**9,unit='ns').round('us')
+        return(pd.DataFrame({col:np.array(self.columnRows(col,first,last)) for col in columns},index=index))
+
+    def iter_chunks(self,rows=10**6,columns=None):
+        # Stream the bundle as DataFrame chunks of at most rows rows
+        for first in range(0,self.layout['rows'],rows):
+            yield(self.frameRows(columns,first,min(first+rows,self.layout['rows'])))
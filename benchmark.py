@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+import pandas as pd
+try:
+    # relative import for use as submodules
+    from . import parseCSI, parseCSV, parseMixedArray, syntheticData
+    from .baseMethods import binBundle
+except:
+    # absolute import for use as standalone
+    import parseCSI, parseCSV, parseMixedArray, syntheticData
+    from baseMethods import binBundle
+
+# Throughput benchmarks for the parsers on synthetic files written by syntheticData
+# Each case reports rows/s, MB/s of source file and the tracemalloc peak, results are saved as JSON
+# e.g. python benchmark.py --rows 10000 1000000 --cases TOB3 TOA5 --output results.json
+# --check instead parses the synthetic files and compares them with the records the writers generated
+
+# Metadata for parseMixedArray, equivalent to the template documented in parseMixedArray.py
+mixedArrayMetadata = lambda: {'Type':'MixedArray','Table':[],'StationName':None,'Logger':None,'SerialNo':None,
+                              'Program':None,'Frequency':None,'Timestamp':None,'Timezone':None,
+                              'Array':{'default':{'Frequency':None,'arrayContents':{'default':{'unit_in':None,'operation':None,'dataType':None}}}}}
+
+def caseTOB3(workDir,rows):
+    sourceFile = os.path.join(workDir,'TOB3_SYNTH.dat')
+    recordsPerFrame = 30
+    syntheticData.writeTOB3(sourceFile,nframes=int(np.ceil(rows/recordsPerFrame)),partialFrames=1,corruptFrames=1)
+    return(sourceFile,lambda: parseCSI.TOB3(sourceFile=sourceFile).DataFrame.shape[0])
+
+def caseTOA5(workDir,rows):
+    sourceFile,_ = syntheticData.writeTOA5(nrows=rows,outputPath=workDir)
+    return(sourceFile,lambda: parseCSI.TOA5(sourceFile=sourceFile).DataFrame.shape[0])
+
+def caseHOBO(workDir,rows):
+    sourceFile = os.path.join(workDir,'HOBO_SYNTH.csv')
+    syntheticData.writeHOBO(sourceFile,nrows=rows)
+    return(sourceFile,lambda: parseCSV.HOBO(sourceFile=sourceFile).DataFrame.shape[0])
+
+def casemixedArray(workDir,rows):
+    sourceFile,DEF_file = os.path.join(workDir,'mixedArray.dat'),os.path.join(workDir,'mixedArray.DEF')
+    syntheticData.writeMixedArray(sourceFile,DEF_file,nrows=rows)
+    return(sourceFile,lambda: sum(t.DataFrame.shape[0] for t in parseCSI.mixedArray(DAT_file=sourceFile,DEF_file=DEF_file).dOuts.values()))
+
+def caseparseMixedArray(workDir,rows):
+    sourceFile,DEF_file = os.path.join(workDir,'mixedArray.dat'),os.path.join(workDir,'mixedArray.DEF')
+    syntheticData.writeMixedArray(sourceFile,DEF_file,nrows=rows)
+    def run():
+        MA = parseMixedArray.parseMixedArray(mode=3,Metadata=mixedArrayMetadata())
+        MA.parse(sourceFile,DEF=DEF_file)
+        return(sum(a['Data'].shape[0] for a in MA.Arrays.values()))
+    return(sourceFile,run)
+
+def casebinBundle(workDir,rows):
+    # Source bytes are the parsed DataFrame's size in memory, the timed step is the write only
+    sourceFile = os.path.join(workDir,'TOB3_SYNTH.dat')
+    syntheticData.writeTOB3(sourceFile,nframes=int(np.ceil(rows/30)))
+    table = parseCSI.TOB3(sourceFile=sourceFile)
+    outputPath = os.path.join(workDir,'bundle')
+    os.makedirs(outputPath,exist_ok=True)
+    def run():
+        binBundle(variableMap=table.variableMap,DataFrame=table.DataFrame,filename='SYNTH',outputPath=outputPath,verbose=False)
+        return(table.DataFrame.shape[0])
+    return(table.DataFrame.memory_usage(deep=True).sum(),run)
+
+cases = {'TOB3':caseTOB3,'TOA5':caseTOA5,'HOBO':caseHOBO,'mixedArray':casemixedArray,
+         'parseMixedArray':caseparseMixedArray,'binBundle':casebinBundle}
+
+def compareFrames(label,parsed,expected):
+    # Mismatches between a parsed DataFrame and the records a synthetic writer put in its file
+    if parsed.shape[0] != expected.shape[0]:
+        return([f"{label}: {parsed.shape[0]} rows parsed, {expected.shape[0]} written"])
+    problems = []
+    if not np.array_equal(parsed.index.values.astype('datetime64[ns]'),expected.index.values.astype('datetime64[ns]')):
+        problems.append(f"{label}: timestamps differ")
+    for column in expected.columns:
+        if column not in parsed.columns:
+            problems.append(f"{label}: {column} missing")
+        elif not np.array_equal(parsed[column].to_numpy(dtype=np.float64),expected[column].to_numpy(dtype=np.float64),equal_nan=True):
+            problems.append(f"{label}: {column} differs")
+    return(problems)
+
+def checkTOB3(workDir,rows):
+    # Serial and parallel decoding, with a partial and a corrupt frame that have to be dropped
+    sourceFile = os.path.join(workDir,'TOB3_SYNTH.dat')
+    expected = syntheticData.writeTOB3(sourceFile,nframes=int(np.ceil(rows/30)),partialFrames=1,corruptFrames=1)
+    return(compareFrames('TOB3',parseCSI.TOB3(sourceFile=sourceFile).DataFrame,expected)+
+           compareFrames('TOB3 workers=2',parseCSI.TOB3(sourceFile=sourceFile,workers=2).DataFrame,expected))
+
+def checkTOA5(workDir,rows):
+    sourceFile,expected = syntheticData.writeTOA5(nrows=rows,outputPath=workDir)
+    return(compareFrames('TOA5',parseCSI.TOA5(sourceFile=sourceFile).DataFrame,expected)+
+           compareFrames('TOA5 fastPath=False',parseCSI.TOA5(sourceFile=sourceFile,fastPath=False).DataFrame,expected))
+
+def checkmixedArray(workDir,rows):
+    sourceFile,DEF_file = os.path.join(workDir,'mixedArray.dat'),os.path.join(workDir,'mixedArray.DEF')
+    expected = syntheticData.writeMixedArray(sourceFile,DEF_file,nrows=rows)
+    tables = parseCSI.mixedArray(DAT_file=sourceFile,DEF_file=DEF_file).dOuts
+    if len(tables) != 1:
+        return([f"mixedArray: {len(tables)} array IDs parsed, 1 written"])
+    return(compareFrames('mixedArray',list(tables.values())[0].DataFrame,expected))
+
+checks = {'TOB3':checkTOB3,'TOA5':checkTOA5,'mixedArray':checkmixedArray}
+
+def runChecks(rows=[10000],caseNames=None,workDir=None,verbose=True):
+    # Round-trip checks of the cases that have one, returns the mismatches
+    problems = []
+    for name in [name for name in (caseNames or checks) if name in checks]:
+        for n in rows:
+            tempDir = tempfile.mkdtemp(dir=workDir)
+            try:
+                found = checks[name](tempDir,n)
+            except Exception as e:
+                found = [f"{name}: {type(e).__name__}: {e}"]
+            finally:
+                shutil.rmtree(tempDir,ignore_errors=True)
+            if verbose:
+                print(f"{name:>16} {n:>12,} rows  "+('ok' if len(found) == 0 else '; '.join(found)))
+            problems += found
+    return(problems)
+
+def measure(run,trace=True):
+    # Wall time of run(), and the tracemalloc peak of a second call when trace is True
+    # (tracing slows allocation heavy code, so the two are kept separate)
+    T = time.perf_counter()
+    nrows = run()
+    seconds = time.perf_counter()-T
+    peak = None
+    if trace:
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return(nrows,seconds,peak)
+
+def gitCommit():
+    try:
+        return(subprocess.run(['git','rev-parse','HEAD'],cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True,text=True,check=True).stdout.strip())
+    except Exception:
+        return(None)
+
+def runBenchmarks(rows=[10000],caseNames=None,repeat=3,trace=True,workDir=None,verbose=True):
+    if caseNames is None:
+        caseNames = list(cases.keys())
+    results = {'commit':gitCommit(),'python':sys.version.split()[0],'numpy':np.__version__,'pandas':pd.__version__,
+               'timestamp':pd.Timestamp.now().isoformat(),'results':[]}
+    for name in caseNames:
+        for n in rows:
+            tempDir = tempfile.mkdtemp(dir=workDir)
+            result = {'case':name,'rows_requested':n}
+            try:
+                source,run = cases[name](tempDir,n)
+                nbytes = os.path.getsize(source) if isinstance(source,str) else int(source)
+                best = None
+                for i in range(repeat):
+                    nrows,seconds,peak = measure(run,trace=(trace and i == 0))
+                    best = seconds if best is None else min(best,seconds)
+                    if peak is not None:
+                        result['peak_bytes'] = peak
+                result |= {'rows':nrows,'bytes':nbytes,'seconds':best,'rows_per_s':nrows/best,'MB_per_s':nbytes/best/1e6}
+            except Exception as e:
+                result['error'] = f'{type(e).__name__}: {e}'
+            finally:
+                shutil.rmtree(tempDir,ignore_errors=True)
+            if verbose:
+                if 'error' in result:
+                    print(f"{name:>16} {n:>12,} rows  failed: {result['error']}")
+                else:
+                    print(f"{name:>16} {result['rows']:>12,} rows {result['rows_per_s']:>14,.0f} rows/s {result['MB_per_s']:>10,.1f} MB/s  peak {result.get('peak_bytes',0)/1e6:>10,.1f} MB")
+            results['results'].append(result)
+    return(results)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parser throughput benchmarks on synthetic data')
+    parser.add_argument('--rows',type=int,nargs='+',default=[10000,100000],help='records per synthetic file')
+    parser.add_argument('--cases',nargs='+',default=None,choices=list(cases.keys()))
+    parser.add_argument('--repeat',type=int,default=3,help='timed runs per case, the fastest is reported')
+    parser.add_argument('--no-trace',action='store_true',help='skip the tracemalloc pass')
+    parser.add_argument('--workDir',default=None,help='where synthetic files are written (default: system temp)')
+    parser.add_argument('--output',default=None,help='JSON file for the results')
+    parser.add_argument('--check',action='store_true',help='compare the parsed synthetic files with the generated records instead of timing them')
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(1 if runChecks(args.rows,args.cases,args.workDir) else 0)
+    results = runBenchmarks(args.rows,args.cases,args.repeat,not args.no_trace,args.workDir)
+    if args.output is not None:
+        with open(args.output,'w') as f:
+            json.dump(results,f,indent=2)
@@ -0,0 +1,213 @@
+try:
+    # relative import for use as submodules
+    from .baseMethods import *
+    from . import parseBatch
+except:
+    # absolute import for use as standalone
+    from baseMethods import *
+    import parseBatch
+
+# One-pass statistics per averaging period (e.g. 30 min blocks of 10 Hz flux data)
+# Chunks of parser output are reduced to per-period counts, means and sums of squared deviations,
+# which are combined across chunks with Chan's parallel form of Welford's update. A period is released once
+# the data have moved past it, so only the open period's accumulators are held between chunks (constant memory)
+
+@dataclass(kw_only=True)
+class blockStats:
+    # period: averaging period (pandas frequency string), periods start at multiples of it from the epoch
+    # columns: variables to average (all numeric columns but RECORD and the timestamp by default)
+    # covariances: pairs of variables, e.g. [('Uz','Ts'),('Uz','CO2')], over the samples where both are valid
+    # flags: diagnostic columns to count flags of per period, {column: diagnosticTable or the name/path of its csv}
+    # label: 'end' labels a period by its end time (EddyPro convention), 'start' by its start time
+    period: str = '30min'
+    columns: list = None
+    covariances: list = field(default_factory=lambda:[])
+    flags: dict = field(default_factory=lambda:{})
+    label: str = 'end'
+    ddof: int = 1
+    chunkRows: int = 10**6
+    Stats: pd.DataFrame = field(default=None,repr=False)
+    summary: dict = field(default_factory=lambda:{},repr=False)
+    instrument: instrument = field(default=None,repr=False)
+    verbose: bool = field(default=False,repr=False)
+
+    def __post_init__(self):
+        self.step = pd.to_timedelta(self.period).value
+        self.covariances = [tuple(pair) for pair in self.covariances]
+        self.flags = {column:table if isinstance(table,diagnosticTable) else diagnosticTable(table=table) for column,table in self.flags.items()}
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.released = None
+        self.summary = {'rows':0,'late':0,'periods':0}
+
+    def run(self,source):
+        # All periods of a source in one pass: a DataFrame, a parsed or header-only table, a binBundleReader,
+        # a mergeTables or any iterable of time-indexed DataFrame chunks
+        periods = list(self.iter_periods(source))
+        self.Stats = pd.concat(periods) if len(periods) > 0 else pd.DataFrame()
+        log(f"{self.summary['periods']} periods from {self.summary['rows']} rows, {self.summary['late']} late rows dropped",verbose=self.verbose)
+        return(self.Stats)
+
+    def iter_periods(self,source):
+        # Yield the stats of completed periods as each chunk is consumed
+        self.reset()
+        for chunk in self.chunks(source):
+            ready = self.update(chunk)
+            if ready is not None:
+                yield(ready)
+        ready = self.flush()
+        if ready is not None:
+            yield(ready)
+
+    def chunks(self,source):
+        if isinstance(source,pd.DataFrame):
+            for first in range(0,source.shape[0],self.chunkRows):
+                yield(source.iloc[first:first+self.chunkRows])
+        elif isinstance(source,binBundleReader):
+            names = None if self.columns is None else list(dict.fromkeys(self.columns+[c for pair in self.covariances for c in pair]))
+            yield from source.iter_chunks(self.chunkRows,names)
+        elif isinstance(source,genericLoggerFile):
+            if source.extract:
+                yield from self.chunks(source.DataFrame)
+            elif not hasattr(source,'iter_chunks'):
+                # No chunked reader for this format (e.g. mixed arrays), parse it whole
+                yield from self.chunks(parseBatch.parseWhole(source).DataFrame)
+            else:
+                # TOB3 chunks are counted in frames
+                yield from source.iter_chunks(max(self.chunkRows//getattr(source,'recordsPerFrame',1),1))
+        elif hasattr(source,'iter_chunks'):
+            yield from source.iter_chunks()
+        else:
+            yield from source
+
+    def update(self,chunk):
+        # Fold one chunk into the open periods, returns the stats of the periods it completes (or None)
+        if chunk.shape[0] == 0:
+            return(None)
+        if self.instrument is None:
+            return(self.updateChunk(chunk))
+        with self.instrument.stage('blockStats',rows=chunk.shape[0]):
+            return(self.updateChunk(chunk))
+
+    def updateChunk(self,chunk):
+        if self.columns is None:
+            # TOB3 tables keep their (numeric) timestamp as a column named like the index
+            self.columns = [c for c in chunk.columns if c not in ['RECORD',chunk.index.name] and pd.api.types.is_numeric_dtype(chunk[c])]
+        if not chunk.index.is_monotonic_increasing:
+            chunk = chunk.iloc[np.argsort(chunk.index.values,kind='stable')]
+        codes = chunk.index.values.astype('datetime64[ns]').astype(np.int64)//self.step
+        if self.released is not None:
+            # Rows of a period that was already released can't be folded in anymore
+            late = codes <= self.released
+            if late.any():
+                self.summary['late'] += int(late.sum())
+                chunk,codes = chunk.iloc[~late],codes[~late]
+        if codes.shape[0] == 0:
+            return(None)
+        self.summary['rows'] += codes.shape[0]
+        starts = np.r_[0,np.flatnonzero(np.diff(codes))+1]
+        block = {'code':codes[starts],'rows':np.diff(np.r_[starts,codes.shape[0]])}
+        block['n'],block['mean'],block['M2'] = self.moments(chunk[self.columns].to_numpy(dtype=np.float64),starts)
+        if len(self.covariances) > 0:
+            x = chunk[[a for a,b in self.covariances]].to_numpy(dtype=np.float64)
+            y = chunk[[b for a,b in self.covariances]].to_numpy(dtype=np.float64)
+            valid = np.isfinite(x)&np.isfinite(y)
+            block['nxy'],block['mx'],_ = self.moments(np.where(valid,x,np.nan),starts)
+            _,block['my'],_ = self.moments(np.where(valid,y,np.nan),starts)
+            # Co-moment about the pair means
+            dx = np.where(valid,x-np.repeat(block['mx'],block['rows'],axis=0),0)
+            dy = np.where(valid,y-np.repeat(block['my'],block['rows'],axis=0),0)
+            block['Cxy'] = np.add.reduceat(dx*dy,starts,axis=0)
+        if len(self.flags) > 0:
+            block['flags'] = np.concatenate([self.flagCounts(chunk,column,table,starts) for column,table in self.flags.items()],axis=1)
+        self.state = block if self.state is None else self.combine(self.state,block)
+        # Every period before the one holding the last sample is complete
+        return(self.release(self.state['code'] < codes[-1]))
+
+    def flagCounts(self,chunk,column,table,starts):
+        counts = table.counts(table.values(chunk[column]),starts)
+        if f'{column}_MISSING' in chunk.columns and chunk[column].dtype.kind in 'biu':
+            # A word packed by the parser (packFlags) carries missing values in its own column
+            counts[:,-1] += np.add.reduceat(chunk[f'{column}_MISSING'].to_numpy(dtype=bool),starts)
+        return(counts)
+
+    def moments(self,X,starts):
+        # Valid counts, means and sums of squared deviations of each column over contiguous row groups
+        valid = np.isfinite(X)
+        n = np.add.reduceat(valid,starts,axis=0).astype(np.int64)
+        total = np.add.reduceat(np.where(valid,X,0),starts,axis=0)
+        mean = np.divide(total,n,out=np.zeros(total.shape),where=n>0)
+        rows = np.diff(np.r_[starts,X.shape[0]])
+        deviation = np.where(valid,X-np.repeat(mean,rows,axis=0),0)
+        return(n,mean,np.add.reduceat(deviation**2,starts,axis=0))
+
+    def combine(self,a,b):
+        # Chan et al. pairwise update of two sets of per-period accumulators, periods missing from one side count as empty
+        code = np.union1d(a['code'],b['code'])
+        ia,ib = np.searchsorted(code,a['code']),np.searchsorted(code,b['code'])
+        align = lambda part,index,key: self.scatter(part[key],index,code.shape[0])
+        out = {'code':code,'rows':align(a,ia,'rows')+align(b,ib,'rows')}
+        out['n'],out['mean'],out['M2'] = self.merge(*[align(part,index,key) for part,index in [(a,ia),(b,ib)] for key in ['n','mean','M2']])
+        if 'Cxy' in a:
+            na,nb = align(a,ia,'nxy'),align(b,ib,'nxy')
+            n = na+nb
+            dx,dy = align(b,ib,'mx')-align(a,ia,'mx'),align(b,ib,'my')-align(a,ia,'my')
+            weight = np.divide(nb,n,out=np.zeros(n.shape),where=n>0)
+            out['nxy'] = n
+            out['mx'] = align(a,ia,'mx')+dx*weight
+            out['my'] = align(a,ia,'my')+dy*weight
+            out['Cxy'] = align(a,ia,'Cxy')+align(b,ib,'Cxy')+dx*dy*na*weight
+        if 'flags' in a:
+            out['flags'] = align(a,ia,'flags')+align(b,ib,'flags')
+        return(out)
+
+    def merge(self,na,ma,M2a,nb,mb,M2b):
+        n = na+nb
+        delta = mb-ma
+        weight = np.divide(nb,n,out=np.zeros(n.shape),where=n>0)
+        return(n,ma+delta*weight,M2a+M2b+delta**2*na*weight)
+
+    def scatter(self,values,index,size):
+        out = np.zeros((size,)+values.shape[1:],dtype=values.dtype)
+        out[index] = values
+        return(out)
+
+    def release(self,done):
+        # Split the completed periods off the accumulators and turn them into a stats table
+        if not done.any():
+            return(None)
+        ready = {key:value[done] for key,value in self.state.items()}
+        self.state = {key:value[~done] for key,value in self.state.items()}
+        self.released = ready['code'][-1]
+        self.summary['periods'] += ready['code'].shape[0]
+        return(self.table(ready))
+
+    def flush(self):
+        # Release whatever is still open at the end of the data
+        if self.state is None or self.state['code'].shape[0] == 0:
+            return(None)
+        return(self.release(np.ones(self.state['code'].shape[0],dtype=bool)))
+
+    def table(self,block):
+        # One row per period: records, then valid count, mean and variance of each column, covariances and flag counts
+        start = block['code']*self.step+(self.step if self.label == 'end' else 0)
+        index = pd.DatetimeIndex(start.astype('datetime64[ns]'),name='TIMESTAMP')
+        divide = lambda a,b: np.divide(a,b,out=np.full(a.shape,np.nan),where=b>0)
+        stats = {'records':block['rows']}
+        mean = np.where(block['n']>0,block['mean'],np.nan)
+        variance = divide(block['M2'],block['n']-self.ddof)
+        for i,c in enumerate(self.columns):
+            stats[f'{c}_n'] = block['n'][:,i]
+            stats[f'{c}_mean'] = mean[:,i]
+            stats[f'{c}_var'] = variance[:,i]
+        if 'Cxy' in block:
+            covariance = divide(block['Cxy'],block['nxy']-self.ddof)
+            for i,(a,b) in enumerate(self.covariances):
+                stats[f'{a}_{b}_n'] = block['nxy'][:,i]
+                stats[f'{a}_{b}_cov'] = covariance[:,i]
+        if 'flags' in block:
+            names = [f'{column}_{flag}_count' for column,table in self.flags.items() for flag in table.names]
+            stats |= {name:block['flags'][:,i] for i,name in enumerate(names)}
+        return(pd.DataFrame(stats,index=index))
@@ -0,0 +1,226 @@
+try:
+    # relative import for use as submodules
+    from .baseMethods import *
+    from .baseMethods import _variableMap
+    from . import parseBatch
+except:
+    # absolute import for use as standalone
+    from baseMethods import *
+    from baseMethods import _variableMap
+    import parseBatch
+
+# Day-partitioned column store for long-term output
+# root/StationName/Table/manifest.yaml holds the variableMap, the ingested sources and, per day partition, the row count,
+# min/max timestamps, stored columns and rows per source. Each partition (root/StationName/Table/YYYY-MM-DD/) has one
+# contiguous raw file per variable named as in binBundle (CO2.ecf32, RECORD.ecu32, ...), the timestamps (_timestamp.tsf64,
+# POSIX seconds) and the source of every row (_source.ecu32). Reads prune partitions with the manifest and memory-map
+# only the requested variables; writes are upserts by source, so re-ingesting a file only rewrites the days it touches
+
+@dataclass(kw_only=True)
+class columnStore:
+    root: str
+    instrument: instrument = field(default=None,repr=False)
+    verbose: bool = field(default=False,repr=False)
+
+    def __post_init__(self):
+        os.makedirs(self.root,exist_ok=True)
+
+    def tablePath(self,StationName,Table):
+        safe = lambda name: re.sub('[^0-9a-zA-Z_.-]+','_',str(name))
+        return(os.path.join(self.root,safe(StationName),safe(Table)))
+
+    def tables(self):
+        # (StationName, Table) directories holding a manifest
+        found = []
+        for station in sorted(os.listdir(self.root)):
+            if os.path.isdir(os.path.join(self.root,station)):
+                found += [(station,table) for table in sorted(os.listdir(os.path.join(self.root,station)))
+                          if os.path.isfile(os.path.join(self.root,station,table,'manifest.yaml'))]
+        return(found)
+
+    def manifest(self,StationName,Table):
+        fn = os.path.join(self.tablePath(StationName,Table),'manifest.yaml')
+        if not os.path.isfile(fn):
+            return({'variableMap':{},'sources':[],'partitions':{}})
+        with open(fn) as f:
+            return(yaml.safe_load(f))
+
+    def writeManifest(self,StationName,Table,manifest):
+        # Replace the manifest in one step so readers never see a partial file
+        fn = os.path.join(self.tablePath(StationName,Table),'manifest.yaml')
+        with open(fn+'.tmp','w') as out:
+            yaml.safe_dump(manifest,out,sort_keys=False)
+        os.replace(fn+'.tmp',fn)
+
+    def ingest(self,table,StationName=None,Table=None,chunkRows=10**6):
+        # Upsert a parsed table under its source file, a header-only one is streamed with iter_chunks
+        # (or parsed whole when its format has no chunked reader)
+        StationName = StationName or getattr(table,'StationName',None)
+        Table = Table or getattr(table,'Table',None)
+        if StationName is None or Table is None:
+            raise ValueError(f"{table.sourceFile} has no StationName/Table, pass them to ingest()")
+        if not table.extract and not hasattr(table,'iter_chunks'):
+            table = parseBatch.parseWhole(table)
+        if table.extract:
+            chunks = (table.DataFrame.iloc[first:first+chunkRows] for first in range(0,table.DataFrame.shape[0],chunkRows))
+        else:
+            # TOB3 chunks are counted in frames
+            chunks = table.iter_chunks(max(chunkRows//getattr(table,'recordsPerFrame',1),1))
+        return(self.upsert(chunks,StationName,Table,os.path.abspath(table.sourceFile),variableMap=table.variableMap))
+
+    def upsert(self,chunks,StationName,Table,source,variableMap={}):
+        # Replace every row of source with the rows in chunks (a DataFrame or an iterable of DataFrame chunks)
+        # Rows are buffered per day and a day is written once the chunks have moved past it, chunks that come back
+        # to a day already written (e.g. a wrapped ring-buffer card) are appended to it
+        if isinstance(chunks,pd.DataFrame):
+            chunks = [chunks]
+        os.makedirs(self.tablePath(StationName,Table),exist_ok=True)
+        manifest = self.manifest(StationName,Table)
+        if source not in manifest['sources']:
+            manifest['sources'].append(source)
+        sourceId = manifest['sources'].index(source)
+        # Days that held rows of this source lose them, unless new rows for the day arrive
+        stale = {day for day,entry in manifest['partitions'].items() if sourceId in entry['sources']}
+        written = set()
+        pending = {}
+        def write(day,DataFrame):
+            # The first write of a day in this upsert replaces the source's rows, later ones add to them
+            self.writePartition(StationName,Table,manifest,day,sourceId,DataFrame,replace=day not in written)
+            written.add(day)
+            stale.discard(day)
+        for chunk in chunks:
+            if chunk.shape[0] == 0:
+                continue
+            chunk = self.storedColumns(chunk,variableMap,manifest)
+            days = chunk.index.floor('D')
+            for day in days.unique():
+                pending.setdefault(day.strftime('%Y-%m-%d'),[]).append(chunk.loc[days == day])
+            last = days[-1].strftime('%Y-%m-%d')
+            for day in [d for d in pending if d < last]:
+                write(day,pd.concat(pending.pop(day)))
+        for day,pieces in pending.items():
+            write(day,pd.concat(pieces))
+        for day in sorted(stale):
+            self.writePartition(StationName,Table,manifest,day,sourceId,None)
+        self.writeManifest(StationName,Table,manifest)
+        log(f"Upserted {source} into {StationName}/{Table}",verbose=self.verbose)
+        return(manifest)
+
+    def remove(self,StationName,Table,source):
+        # Drop every row of a source
+        return(self.upsert([],StationName,Table,source))
+
+    def storedColumns(self,DataFrame,variableMap,manifest):
+        # Numeric and flag columns that are not ignored, under their variableName, and their variableMap entries
+        titles = {var.get('title'):name for name,var in variableMap.items() if isinstance(var,dict)}
+        keep = {}
+        for column,dtype in DataFrame.dtypes.items():
+            name = column if column in variableMap else titles.get(column,column)
+            var = variableMap.get(name,{})
+            if var.get('ignore') or not isinstance(dtype,np.dtype) or dtype.kind not in 'biuf':
+                continue
+            name = re.sub('[^0-9a-zA-Z]+',_variableMap.fillChar,str(name))
+            keep[column] = name
+            manifest['variableMap'][name] = dict(var)|{'dtype':dtype.str}
+        return(DataFrame[list(keep.keys())].rename(columns=keep))
+
+    def writePartition(self,StationName,Table,manifest,day,sourceId,DataFrame,replace=True):
+        # Rewrite one day: the rows of other sources are kept, the rows of sourceId are replaced by DataFrame
+        # (or kept too and DataFrame added to them, with replace=False)
+        path = os.path.join(self.tablePath(StationName,Table),day)
+        entry = manifest['partitions'].get(day)
+        with (nullStage() if self.instrument is None else self.instrument.stage('columnStore',file=path)) as record:
+            columns = {}
+            if entry is not None:
+                columns['_source'] = np.array(self.memmap(path,'_source.ecu32',np.uint32,entry['rows']))
+                keep = columns['_source'] != sourceId if replace else np.ones(entry['rows'],dtype=bool)
+                columns['_source'] = columns['_source'][keep]
+                columns['_timestamp'] = np.asarray(self.memmap(path,'_timestamp.tsf64',np.float64,entry['rows']))[keep]
+                for name,dtype in entry['columns'].items():
+                    columns[name] = np.asarray(self.memmap(path,f'{name}{binExtension(dtype)}',np.dtype(dtype),entry['rows']))[keep]
+            old = columns['_source'].shape[0] if entry is not None else 0
+            new = 0 if DataFrame is None else DataFrame.shape[0]
+            if new > 0:
+                added = {'_timestamp':DataFrame.index.values.astype('datetime64[ns]').astype(np.int64)/10**9,
+                         '_source':np.full(new,sourceId,dtype=np.uint32)}|{name:DataFrame[name].to_numpy() for name in DataFrame.columns}
+                columns = {name:self.stack(columns.get(name),old,added.get(name),new) for name in list(columns)+[n for n in added if n not in columns]}
+            rows = old+new
+            if rows == 0:
+                shutil.rmtree(path,ignore_errors=True)
+                manifest['partitions'].pop(day,None)
+                return
+            # Rows with equal timestamps are ordered by source, so re-ingesting a file gives the same partition
+            order = np.lexsort((columns['_source'],columns['_timestamp']))
+            tmp = path+'.tmp'
+            shutil.rmtree(tmp,ignore_errors=True)
+            os.makedirs(tmp)
+            for name,values in columns.items():
+                values = values[order]
+                ext = '.tsf64' if name == '_timestamp' else binExtension(values.dtype)
+                np.ascontiguousarray(values,dtype=values.dtype.newbyteorder('<')).tofile(os.path.join(tmp,f'{name}{ext}'))
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.replace(tmp,path)
+            sources,counts = np.unique(columns['_source'],return_counts=True)
+            toISO = lambda seconds: pd.to_datetime(seconds*10**9,unit='ns').round('us').isoformat(sep=' ')
+            manifest['partitions'][day] = {
+                'rows':rows,
+                'start':toISO(columns['_timestamp'][order[0]]),
+                'end':toISO(columns['_timestamp'][order[-1]]),
+                'columns':{name:values.dtype.newbyteorder('<').str for name,values in columns.items() if not name.startswith('_')},
+                'sources':{int(s):int(n) for s,n in zip(sources,counts)},
+                }
+            manifest['partitions'] = dict(sorted(manifest['partitions'].items()))
+            record['rows'] = rows
+
+    def stack(self,old,nold,new,nnew):
+        # Concatenate kept and new values of a variable, rows missing one side are NaN (integers and flags become float64)
+        if (old is None and nold == 0) or (new is None and nnew == 0):
+            return(new if old is None else old)
+        if old is None or new is None:
+            have = old if new is None else new
+            if have.dtype.kind != 'f':
+                have = have.astype(np.float64)
+            missing = np.full(nold if old is None else nnew,np.nan,dtype=have.dtype)
+            return(np.concatenate([missing,have]) if old is None else np.concatenate([have,missing]))
+        return(np.concatenate([old,new]))
+
+    def memmap(self,path,name,dtype,rows):
+        if rows == 0:
+            return(np.zeros(0,dtype=dtype))
+        return(np.memmap(os.path.join(path,name),dtype=np.dtype(dtype).newbyteorder('<'),mode='r',shape=(rows,)))
+
+    def partitions(self,StationName,Table,start=None,end=None):
+        # Days whose [start, end] overlaps the requested range, from the manifest alone
+        manifest = self.manifest(StationName,Table)
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        return({day:entry for day,entry in manifest['partitions'].items()
+                if (end is None or pd.Timestamp(entry['start']) <= end) and (start is None or pd.Timestamp(entry['end']) >= start)})
+
+    def iter_chunks(self,StationName,Table,columns=None,start=None,end=None):
+        # Stream the rows in [start, end] as one DataFrame per day partition, only the requested columns are read
+        toPOSIX = lambda t: pd.Timestamp(t).value/10**9
+        for day,entry in self.partitions(StationName,Table,start,end).items():
+            path = os.path.join(self.tablePath(StationName,Table),day)
+            Timestamp = self.memmap(path,'_timestamp.tsf64',np.float64,entry['rows'])
+            first = 0 if start is None else int(np.searchsorted(Timestamp,toPOSIX(start),side='left'))
+            last = entry['rows'] if end is None else int(np.searchsorted(Timestamp,toPOSIX(end),side='right'))
+            if last <= first:
+                continue
+            names = list(entry['columns']) if columns is None else columns
+            data = {}
+            for name in names:
+                if name in entry['columns']:
+                    data[name] = np.array(self.memmap(path,f"{name}{binExtension(entry['columns'][name])}",entry['columns'][name],entry['rows'])[first:last])
+                else:
+                    data[name] = np.full(last-first,np.nan)
+            index = pd.DatetimeIndex(pd.to_datetime(Timestamp[first:last]*10**9,unit='ns').round('us'),name='TIMESTAMP')
+            yield(pd.DataFrame(data,index=index))
+
+    def read(self,StationName,Table,columns=None,start=None,end=None):
+        # The requested columns over [start, end] as one DataFrame
+        chunks = list(self.iter_chunks(StationName,Table,columns,start,end))
+        if len(chunks) == 0:
+            return(pd.DataFrame(columns=columns,index=pd.DatetimeIndex([],name='TIMESTAMP')))
+        return(pd.concat(chunks))
@@ -0,0 +1,168 @@
+import sqlite3
+try:
+    # relative import for use as submodules
+    from .baseMethods import *
+except:
+    # absolute import for use as standalone
+    from baseMethods import *
+
+# SQLite catalog of the raw files that have been parsed: file identity (path, size, mtime, content hash), header metadata,
+# time and RECORD ranges and parse status, one row per table found in a file
+# Batch jobs look files up by path (indexed) to skip what was already ingested, coverage queries answer
+# "which files hold table X between t0 and t1" without opening any of them
+# status: 'parsed' (full parse), 'scanned' (header-only pass), 'duplicate' (same contents as a file already ingested) or 'failed'
+
+schema = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    hash TEXT,
+    fileType TEXT,
+    StationName TEXT,
+    LoggerModel TEXT,
+    SerialNo TEXT,
+    program TEXT,
+    "Table" TEXT,
+    frequency TEXT,
+    startTime INTEGER,
+    endTime INTEGER,
+    firstRecord INTEGER,
+    lastRecord INTEGER,
+    rows INTEGER,
+    status TEXT,
+    error TEXT,
+    ingested TEXT
+);
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+CREATE INDEX IF NOT EXISTS files_coverage ON files ("Table",startTime,endTime);
+'''
+def fileHash(sourceFile):
+    # SHA-1 of the file contents, a module function so batches can hash on their process pool
+    sha = hashlib.sha1()
+    with open(sourceFile,'rb') as f:
+        for block in iter(lambda: f.read(2**20),b''):
+            sha.update(block)
+    return(sha.hexdigest())
+
+columns = ['path','size','mtime_ns','hash','fileType','StationName','LoggerModel','SerialNo','program','Table',
+           'frequency','startTime','endTime','firstRecord','lastRecord','rows','status','error','ingested']
+
+@dataclass(kw_only=True)
+class ingestCatalog:
+    database: str
+    # Hash file contents when recording, so copies of a file (e.g. overlapping card dumps in other folders) are recognized
+    hashContents: bool = True
+    verbose: bool = field(default=False,repr=False)
+
+    def __post_init__(self):
+        self.connection = sqlite3.connect(self.database)
+        self.connection.executescript(schema)
+        # Content hashes from pending(), reused by record(), and the copies found within the batch, {original: [copies]}
+        self.digests = {}
+        self.copies = {}
+
+    def close(self):
+        self.connection.close()
+
+    def identity(self,sourceFile):
+        stat = os.stat(sourceFile)
+        return(os.path.abspath(sourceFile),stat.st_size,stat.st_mtime_ns)
+
+    def digest(self,sourceFile):
+        # Content hash of a file, computed once
+        path = os.path.abspath(sourceFile)
+        if path not in self.digests:
+            self.digests[path] = fileHash(sourceFile)
+        return(self.digests[path])
+
+    def record(self,sourceFile,tables,error=None,status='parsed'):
+        # Replace the rows of a file with one row per table (parsed tables or their inventory() rows), or a single failed row
+        # Copies of the file found in the same batch are recorded along with it
+        path,size,mtime_ns = self.identity(sourceFile)
+        digest = self.digest(sourceFile) if self.hashContents else None
+        now = pd.Timestamp.now().isoformat(sep=' ')
+        toNs = lambda t: None if t is None or pd.isna(t) else int(pd.Timestamp(t).value)
+        rows = []
+        for table in tables:
+            info = table if isinstance(table,dict) else table.inventory()
+            info = info|{'startTime':toNs(info.get('startTime')),'endTime':toNs(info.get('endTime'))}
+            rows.append([path,size,mtime_ns,digest]+[info.get(column) for column in columns[4:16]]+[status,None,now])
+        if error is not None or len(rows) == 0:
+            rows = [[path,size,mtime_ns,digest]+[None]*12+['failed',error,now]]
+        with self.connection:
+            self.connection.execute('DELETE FROM files WHERE path=?',(path,))
+            self.connection.executemany(f'INSERT INTO files VALUES ({",".join("?"*len(columns))})',rows)
+        for copy in self.copies.pop(path,[]):
+            if not self.copyOf(copy,statuses=(status,)):
+                self.record(copy,[],error)
+
+    def lookup(self,sourceFile):
+        # Status of a file if the catalog holds it unchanged (same path, size and mtime), otherwise None
+        path,size,mtime_ns = self.identity(sourceFile)
+        row = self.connection.execute('SELECT status FROM files WHERE path=? AND size=? AND mtime_ns=? LIMIT 1',(path,size,mtime_ns)).fetchone()
+        return(None if row is None else row[0])
+
+    def pending(self,files,done=('parsed','duplicate'),mapper=map):
+        # Files not yet ingested or changed since they were. With hashContents, a file whose contents were already
+        # ingested under another path is recorded as a duplicate, and one repeating an earlier file of the list is
+        # left out and recorded once that file is. mapper hashes the files (e.g. a process pool's map)
+        todo = [sourceFile for sourceFile in files if self.lookup(sourceFile) not in done]
+        if not self.hashContents:
+            return(todo)
+        self.digests = dict(zip(map(os.path.abspath,todo),mapper(fileHash,todo)))
+        self.copies = {}
+        unique,first = [],{}
+        for sourceFile in todo:
+            digest = self.digest(sourceFile)
+            if self.copyOf(sourceFile):
+                continue
+            if digest in first:
+                log(f"{sourceFile} is a copy of {first[digest]}",verbose=self.verbose)
+                self.copies.setdefault(os.path.abspath(first[digest]),[]).append(sourceFile)
+                continue
+            first[digest] = sourceFile
+            unique.append(sourceFile)
+        return(unique)
+
+    def copyOf(self,sourceFile,statuses=('parsed',)):
+        # Record a file as a duplicate of a file already cataloged with the same contents and one of the statuses
+        path,size,mtime_ns = self.identity(sourceFile)
+        digest = self.digest(sourceFile)
+        original = self.connection.execute(f"SELECT * FROM files WHERE hash=? AND size=? AND path!=? AND status IN ({','.join('?'*len(statuses))})",
+                                           (digest,size,path)+tuple(statuses)).fetchall()
+        if len(original) == 0:
+            return(False)
+        log(f"{sourceFile} is a copy of {original[0][0]}",verbose=self.verbose)
+        now = pd.Timestamp.now().isoformat(sep=' ')
+        with self.connection:
+            self.connection.execute('DELETE FROM files WHERE path=?',(path,))
+            self.connection.executemany(f'INSERT INTO files VALUES ({",".join("?"*len(columns))})',
+                [[path,size,mtime_ns]+list(row[3:16])+['duplicate',None,now] for row in original])
+        return(True)
+
+    def forget(self,sourceFile):
+        with self.connection:
+            self.connection.execute('DELETE FROM files WHERE path=?',(os.path.abspath(sourceFile),))
+
+    def query(self,sql,params=()):
+        DataFrame = pd.read_sql_query(sql,self.connection,params=params)
+        for column in ['startTime','endTime']:
+            DataFrame[column] = pd.to_datetime(DataFrame[column],unit='ns')
+        return(DataFrame)
+
+    def files(self,status=None):
+        # The whole catalog, or the rows with one status
+        if status is None:
+            return(self.query('SELECT * FROM files ORDER BY path'))
+        return(self.query('SELECT * FROM files WHERE status=? ORDER BY path',(status,)))
+
+    def covering(self,Table,start=None,end=None,StationName=None):
+        # Files holding records of a table between start and end, in time order (copies and failures left out)
+        sql = '''SELECT * FROM files WHERE "Table"=? AND status IN ('parsed','scanned') AND startTime<=? AND endTime>=?'''
+        params = [Table,pd.Timestamp.max.value if end is None else pd.Timestamp(end).value,pd.Timestamp.min.value if start is None else pd.Timestamp(start).value]
+        if StationName is not None:
+            sql += ' AND StationName=?'
+            params.append(StationName)
+        return(self.query(sql+' ORDER BY startTime',params))
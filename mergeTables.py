@@ -0,0 +1,216 @@
+import heapq
+try:
+    # relative import for use as submodules
+    from .baseMethods import *
+    from . import parseBatch
+except:
+    # absolute import for use as standalone
+    from baseMethods import *
+    import parseBatch
+
+# Merge the files of one station/table into a single time-sorted series
+# Each source is already time-sorted, so sources are merged chunk by chunk (k-way) in order of their first timestamp,
+# a source is only opened (parsed) once the merge reaches its start time and only a few chunks per source are held in memory
+# Overlapping records are dropped, gaps are reported and the output can be reindexed onto the regular frequency grid
+
+@dataclass(kw_only=True)
+class mergeTables:
+    # sources: parsed tables (genericLoggerFile), header-only TOB3 tables (streamed with iter_chunks),
+    # binBundleReader objects, DataFrames with a DatetimeIndex or paths to raw files (scanned header-only first)
+    sources: list
+    # 'RECORD': a record is a duplicate when both its timestamp and RECORD number were seen (timestamp alone when there is no RECORD column)
+    # 'timestamp': a record is a duplicate when its timestamp was seen, None: keep everything
+    dedupe: str = 'RECORD'
+    keep: str = 'first'
+    reindex: bool = False
+    frequency: str = None
+    chunkRows: int = 10**6
+    parserKwargs: dict = field(default_factory=lambda:{},repr=False)
+    variableMap: dict = field(default_factory=lambda:{},repr=False)
+    gaps: pd.DataFrame = field(default=None,repr=False)
+    summary: dict = field(default_factory=lambda:{},repr=False)
+    verbose: bool = field(default=False,repr=False)
+
+    def iter_chunks(self):
+        # Yield the merged series as time-sorted chunks
+        # A row is released once every pending source has moved past it (the watermark), so duplicates always meet in the buffer
+        self.summary = {'rows':0,'duplicates':0,'late':0,'offGrid':0,'sources':0}
+        self.gapList = []
+        self.lastTimestamp,self.lastGrid = None,None
+        heap = []
+        for i,source in enumerate(self.sources):
+            startTime,opener = self.feed(source)
+            if startTime is not None:
+                heap.append((startTime,i,0,None,opener))
+        heapq.heapify(heap)
+        buffer = []
+        while heap:
+            startTime,i,seq,chunk,source = heapq.heappop(heap)
+            if chunk is None:
+                # First turn of this source
+                source = iter(source())
+                self.summary['sources'] += 1
+                chunk = self.nextChunk(source)
+                if chunk is None:
+                    continue
+                if chunk.index[0] > startTime:
+                    heapq.heappush(heap,(chunk.index[0],i,seq+1,chunk,source))
+                    continue
+            buffer.append(chunk)
+            upcoming = self.nextChunk(source)
+            if upcoming is not None:
+                heapq.heappush(heap,(upcoming.index[0],i,seq+1,upcoming,source))
+            ready = self.release(buffer,heap[0][0] if heap else None)
+            if ready is not None:
+                yield(ready)
+        self.gaps = pd.DataFrame(self.gapList,columns=['start','end','missing'])
+        log(f"Merged {self.summary['sources']} sources: {self.summary}, {self.gaps.shape[0]} gaps",verbose=self.verbose)
+
+    def merge(self):
+        # The whole merged series in memory
+        chunks = list(self.iter_chunks())
+        self.DataFrame = pd.concat(chunks) if len(chunks) > 0 else pd.DataFrame()
+        return(self.DataFrame)
+
+    def toBundle(self,filename,outputPath,**kwds):
+        # Stream the merged series into a binBundle without holding it in memory
+        bundle = None
+        for chunk in self.iter_chunks():
+            if bundle is None:
+                variableMap = copy.deepcopy(self.variableMap)
+                if self.reindex:
+                    # Grid points without a record are NaN, integer and flag columns are stored as float64
+                    for var in variableMap.values():
+                        if var.get('dtype') is not None and np.dtype(var['dtype']).kind in 'biu':
+                            var['dtype'] = np.dtype('float64').str
+                bundle = binBundle(variableMap=variableMap,filename=filename,outputPath=outputPath,**kwds)
+            bundle.write(chunk)
+        return(bundle)
+
+    def feed(self,source):
+        # Start time of a source and a function opening it as an iterator of DataFrame chunks
+        if type(source) is str:
+            tables,error = parseBatch.parseFile(source,parserKwargs=self.parserKwargs,extract=False)
+            if error is not None:
+                raise ValueError(error)
+            if len(tables) != 1:
+                raise ValueError(f"{source} holds {len(tables)} tables, pass the parsed tables instead")
+            source = tables[0][-1]
+        if isinstance(source,pd.DataFrame):
+            if source.shape[0] == 0:
+                return(None,None)
+            self.setFrequency(self.estimateFrequency(source.index.sort_values().values))
+            return(source.index.min(),lambda: self.slices(source))
+        if isinstance(source,binBundleReader):
+            if source.layout['rows'] == 0:
+                return(None,None)
+            self.updateMap(source.variableMap)
+            return(pd.to_datetime(source.Timestamp[0]*10**9,unit='ns').round('us'),lambda: source.iter_chunks(self.chunkRows))
+        startTime,_ = source.timeSpan()
+        if startTime is None:
+            return(None,None)
+        self.setFrequency(source.frequency)
+        if source.extract:
+            self.updateMap(source.variableMap)
+            return(startTime,lambda: self.slices(source.DataFrame))
+        return(startTime,lambda: self.stream(source))
+
+    def stream(self,table):
+        # Parse a header-only table once the merge reaches it: TOB3 and csv files are read in chunks, other formats are parsed whole
+        if hasattr(table,'iter_chunks'):
+            # TOB3 chunks are counted in frames
+            for chunk in table.iter_chunks(max(self.chunkRows//getattr(table,'recordsPerFrame',1),1)):
+                self.updateMap(table.variableMap)
+                yield(chunk)
+        else:
+            table = parseBatch.parseWhole(table,self.parserKwargs)
+            self.updateMap(table.variableMap)
+            yield from self.slices(table.DataFrame)
+
+    def slices(self,DataFrame):
+        for first in range(0,DataFrame.shape[0],self.chunkRows):
+            yield(DataFrame.iloc[first:first+self.chunkRows])
+
+    def updateMap(self,variableMap):
+        self.variableMap = {key:value for key,value in variableMap.items() if key != '_bundle'}|self.variableMap
+
+    def setFrequency(self,frequency):
+        if self.frequency is None and frequency is not None:
+            self.frequency = frequency
+
+    def estimateFrequency(self,times):
+        # Median step between distinct timestamps, None until there are two of them
+        steps = np.diff(np.asarray(times).astype('datetime64[ns]')).astype(np.int64)
+        steps = steps[steps > 0]
+        if steps.shape[0] == 0:
+            return(None)
+        return(f"{np.median(steps)/1e9}s")
+
+    def nextChunk(self,source):
+        # Next non-empty chunk of an open source, sorted by time
+        for chunk in source:
+            if chunk.shape[0] > 0:
+                return(self.sortChunk(chunk))
+        return(None)
+
+    def sortChunk(self,chunk):
+        if not chunk.index.is_monotonic_increasing:
+            chunk = chunk.iloc[np.argsort(chunk.index.values,kind='stable')]
+        return(chunk)
+
+    def release(self,buffer,watermark):
+        # Split the buffer at the watermark, rows before it are final
+        DataFrame = pd.concat(buffer) if len(buffer) > 1 else buffer[0]
+        DataFrame = self.sortChunk(DataFrame)
+        cut = DataFrame.shape[0] if watermark is None else int(np.searchsorted(DataFrame.index.values,np.datetime64(watermark),side='left'))
+        buffer[:] = [DataFrame.iloc[cut:]] if cut < DataFrame.shape[0] else []
+        if cut == 0:
+            return(None)
+        return(self.finish(DataFrame.iloc[:cut]))
+
+    def finish(self,ready):
+        # Drop late and duplicate rows, record gaps and optionally reindex onto the frequency grid
+        if self.lastTimestamp is not None:
+            # Only rows of a source that is itself out of order can end up behind what was already released
+            late = ready.index <= self.lastTimestamp
+            if late.any():
+                self.summary['late'] += int(late.sum())
+                ready = ready.iloc[~late]
+        if self.dedupe is not None:
+            keys = ready.index
+            if self.dedupe == 'RECORD' and 'RECORD' in ready.columns:
+                keys = pd.MultiIndex.from_arrays([ready.index,ready['RECORD'].values])
+            duplicated = keys.duplicated(keep=self.keep)
+            self.summary['duplicates'] += int(duplicated.sum())
+            ready = ready.iloc[~duplicated]
+        if ready.shape[0] == 0:
+            return(None)
+        times = ready.index.values.astype('datetime64[ns]')
+        if self.lastTimestamp is not None:
+            times = np.concatenate([[np.datetime64(self.lastTimestamp,'ns')],times])
+        self.setFrequency(self.estimateFrequency(times))
+        if self.frequency is None:
+            # A single timestamp so far, gaps and the grid start once the step is known
+            self.lastTimestamp = ready.index[-1]
+            if self.reindex:
+                ready = ready.iloc[~ready.index.duplicated(keep=self.keep)]
+                self.lastGrid = ready.index[-1]
+            self.summary['rows'] += ready.shape[0]
+            return(ready)
+        step = pd.to_timedelta(self.frequency)
+        delta = np.diff(times)
+        for k in np.nonzero(delta > 1.5*step.to_timedelta64())[0]:
+            self.gapList.append({'start':pd.Timestamp(times[k])+step,'end':pd.Timestamp(times[k+1])-step,
+                                 'missing':int(round(delta[k]/step.to_timedelta64()))-1})
+        self.lastTimestamp = ready.index[-1]
+        if self.reindex:
+            ready = ready.iloc[~ready.index.duplicated(keep=self.keep)]
+            first = ready.index[0] if self.lastGrid is None else self.lastGrid+step
+            grid = pd.date_range(first,ready.index[-1],freq=step,name=ready.index.name)
+            if grid.shape[0] == 0:
+                return(None)
+            self.summary['offGrid'] += int((~ready.index.isin(grid)).sum())
+            ready = ready.reindex(grid)
+            self.lastGrid = grid[-1]
+        self.summary['rows'] += ready.shape[0]
+        return(ready)
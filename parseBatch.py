@@ -0,0 +1,193 @@
+try:
+    # relative import for use as submodules
+    from .baseMethods import * 
+    from . import parseCSI
+    from . import parseCSV
+    from .ingestCatalog import ingestCatalog
+except:
+    # absolute import for use as standalone
+    from baseMethods import * 
+    import parseCSI
+    import parseCSV
+    from ingestCatalog import ingestCatalog
+import traceback
+import functools
+from concurrent.futures import ProcessPoolExecutor,as_completed
+
+def sniffFormat(sourceFile):
+    # Identify the file format from the preamble: TOA5/TOB3 tag, HOBO plot title, or a mixed array with a .DEF file alongside
+    with open(sourceFile,'rb') as f:
+        line = f.readline(4096).lstrip(b'\xef\xbb\xbf').strip()
+    tag = line.split(b',')[0].replace(b'"',b'')
+    if tag in [b'TOA5',b'TOB3']:
+        return(tag.decode('ascii'))
+    if tag.startswith(b'Plot Title'):
+        return('HOBO')
+    if sourceFile.lower().endswith('.dat') and re.fullmatch(rb'[0-9]+(,[-+.0-9eE]*)+',line) and findDEF(sourceFile) is not None:
+        return('mixedArray')
+    return(None)
+
+@functools.lru_cache(maxsize=1024)
+def listDEF(directory):
+    # .DEF files in a directory, cached so a directory of many mixed arrays is listed once per run
+    return([f for f in os.listdir(directory) if f.upper().endswith('.DEF')])
+
+def findDEF(sourceFile):
+    # The single .DEF file in the same directory as a mixed array, if there is one
+    d = os.path.dirname(os.path.abspath(sourceFile))
+    DEF = listDEF(d)
+    if len(DEF) != 1:
+        return(None)
+    return(os.path.join(d,DEF[0]))
+
+def groupKey(table):
+    # (StationName, Table) a parsed table is grouped under, HOBO files have neither so each logger
+    # (serial number from the column titles, or the file name when there is none) is a group of its own
+    if isinstance(table,parseCSV.HOBO):
+        return(('HOBO',table.SerialNo or os.path.splitext(os.path.basename(table.sourceFile))[0]))
+    return((getattr(table,'StationName',None),getattr(table,'Table',None)))
+
+def parseFile(sourceFile,fileType=None,parserKwargs={},extract=True):
+    # Parse one file with the parser for its format, returns a list of (StationName, Table, parsed table) (see groupKey) and an error message
+    # extract=False runs the parsers' header-only pass
+    try:
+        if fileType is None:
+            fileType = sniffFormat(sourceFile)
+        if fileType is None:
+            raise ValueError(f"Could not identify the format of {sourceFile}")
+        kwds = parserKwargs.get(fileType,{})|{'extract':extract}
+        if fileType == 'mixedArray':
+            tables = list(parseCSI.mixedArray(DAT_file=sourceFile,DEF_file=findDEF(sourceFile),**kwds).dOuts.values())
+        elif fileType == 'HOBO':
+            tables = [parseCSV.HOBO(sourceFile=sourceFile,**kwds)]
+        else:
+            tables = [getattr(parseCSI,fileType)(sourceFile=sourceFile,**kwds)]
+        for table in tables:
+            # Closed file handles can't be sent back from a worker process
+            if hasattr(table,'fileObject'):
+                table.fileObject = None
+        return([groupKey(table)+(table,) for table in tables],None)
+    except Exception:
+        return([],traceback.format_exc())
+
+def parseWhole(table,parserKwargs={}):
+    # Full parse of a header-only table that can't be streamed (e.g. one array ID of a mixed array): its file is parsed
+    # again with extract=True and the table with the same Table name is returned
+    tables,error = parseFile(table.sourceFile,parserKwargs=parserKwargs)
+    if error is not None:
+        raise ValueError(error)
+    matches = [parsed for _,_,parsed in tables if getattr(parsed,'Table',None) == getattr(table,'Table',None)]
+    if len(matches) == 0:
+        raise ValueError(f"{getattr(table,'Table',None)} not found in {table.sourceFile}")
+    return(matches[0])
+
+def inventoryFile(sourceFile,fileType=None,parserKwargs={}):
+    # Header-only pass over one file, returns one inventory row per table and an error message
+    tables,error = parseFile(sourceFile,fileType=fileType,parserKwargs=parserKwargs,extract=False)
+    return([table.inventory() for _,_,table in tables],error)
+
+@dataclass(kw_only=True)
+class parseBatch:
+    # Parse many files (or every file in a directory tree) with format detection, on a process pool
+    # results are grouped by (StationName, Table), per-file failures are collected in failures
+    # With a catalog (an ingestCatalog or the path of its database) files already ingested and unchanged are skipped
+    # and every parsed or failed file is recorded
+    sources: list
+    workers: int = None
+    recursive: bool = True
+    extensions: list = field(default_factory=lambda:['.dat','.csv'])
+    parserKwargs: dict = field(default_factory=lambda:{},repr=False)
+    results: dict = field(default_factory=lambda:{},repr=False)
+    failures: list = field(default_factory=lambda:[],repr=False)
+    catalog: ingestCatalog = field(default=None,repr=False)
+    skipIngested: bool = True
+    verbose: bool = field(default=False,repr=False)
+
+    def __post_init__(self):
+        listDEF.cache_clear()
+        self.files = self.listFiles()
+        if self.workers == 1:
+            self.openCatalog(done=('parsed','duplicate'))
+            for sourceFile in self.files:
+                self.collect(sourceFile,*parseFile(sourceFile,parserKwargs=self.parserKwargs))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                self.openCatalog(done=('parsed','duplicate'),mapper=pool.map)
+                jobs = {pool.submit(parseFile,sourceFile,parserKwargs=self.parserKwargs):sourceFile for sourceFile in self.files}
+                for job in as_completed(jobs):
+                    try:
+                        self.collect(jobs[job],*job.result())
+                    except Exception:
+                        self.collect(jobs[job],[],traceback.format_exc())
+        for key in self.results:
+            self.results[key].sort(key=lambda table: table.DataFrame.index.min() if table.DataFrame.shape[0]>0 else pd.Timestamp.max)
+
+    def listFiles(self):
+        if type(self.sources) is str:
+            self.sources = [self.sources]
+        files = []
+        for source in self.sources:
+            if os.path.isdir(source):
+                for root,dirs,names in os.walk(source):
+                    files += [os.path.join(root,f) for f in sorted(names) if os.path.splitext(f)[-1].lower() in self.extensions]
+                    if not self.recursive:
+                        break
+            else:
+                files.append(source)
+        return(files)
+
+    def openCatalog(self,done,mapper=map):
+        # Drop the files the catalog already holds with one of the done statuses, and copies of other files
+        # New files are hashed with mapper, the pool's map when parsing in parallel
+        self.skipped = []
+        if type(self.catalog) is str:
+            self.catalog = ingestCatalog(database=self.catalog,verbose=self.verbose)
+        if self.catalog is not None and self.skipIngested:
+            todo = self.catalog.pending(self.files,done=done,mapper=mapper)
+            self.skipped = [f for f in self.files if f not in set(todo)]
+            self.files = todo
+            log(f"Skipping {len(self.skipped)} files already in the catalog",verbose=self.verbose)
+
+    def collect(self,sourceFile,tables,error):
+        if self.catalog is not None:
+            self.catalog.record(sourceFile,[table for _,_,table in tables],error)
+        if error is not None:
+            log(f"Failed to parse {sourceFile}:\n{error}",verbose=self.verbose)
+            self.failures.append({'sourceFile':sourceFile,'error':error})
+        for StationName,Table,table in tables:
+            self.results.setdefault((StationName,Table),[]).append(table)
+
+@dataclass(kw_only=True)
+class scanInventory(parseBatch):
+    # Header-only scan of an archive on a process pool: one row per table found in each file
+    # (station, logger, serial number, program, table, frequency and time span), written to outputFile (.csv) when given
+    outputFile: str = None
+    chunksize: int = 64
+    Inventory: pd.DataFrame = field(default=None,repr=False)
+
+    def __post_init__(self):
+        listDEF.cache_clear()
+        self.files = self.listFiles()
+        scan = functools.partial(inventoryFile,parserKwargs=self.parserKwargs)
+        if self.workers == 1:
+            self.openCatalog(done=('parsed','scanned','duplicate'))
+            self.collect(map(scan,self.files))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                self.openCatalog(done=('parsed','scanned','duplicate'),mapper=functools.partial(pool.map,chunksize=self.chunksize))
+                self.collect(pool.map(scan,self.files,chunksize=self.chunksize))
+        if self.outputFile is not None:
+            self.Inventory.to_csv(self.outputFile,index=False)
+
+    def collect(self,scanned):
+        rows = []
+        for sourceFile,(records,error) in zip(self.files,scanned):
+            if self.catalog is not None:
+                self.catalog.record(sourceFile,records,error,status='scanned')
+            if error is not None:
+                log(f"Failed to scan {sourceFile}:\n{error}",verbose=self.verbose)
+                self.failures.append({'sourceFile':sourceFile,'error':error})
+            rows += records
+        self.Inventory = pd.DataFrame(rows,columns=['sourceFile','fileType','StationName','LoggerModel','SerialNo','program',
+                                                    'Table','frequency','startTime','endTime','variables','bytes',
+                                                    'firstRecord','lastRecord','rows'])
@@ -1,12 +1,88 @@
 try:
     # relative import for use as submodules
     from .baseMethods import * 
+    from .baseMethods import _variableMap
 except:
     # absolute import for use as standalone
     from baseMethods import * 
+    from baseMethods import _variableMap
 import datetime
 import struct
+import copy
+import io
+import itertools
 import os
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+def FP2_table():
+    # Float32 value of every possible 16-bit FP2 code, so whole columns can be decoded with one take
+    # adapted from: https://github.com/ansell/camp2ascii/tree/cea750fb721df3d3ccc69fe7780b372d20a8160d
+    code = np.arange(0x10000,dtype=np.uint32)
+    sign = (0x8000 & code) >> 15
+    exponent = (0x6000 & code) >> 13
+    mantissa = (0x1FFF & code)
+    table = mantissa*np.array([1,1e-1,1e-2,1e-3])[exponent]
+    table[sign != 0] *= -1
+    # Campbell special values
+    table[0x1FFF] = np.inf
+    table[0x9FFF] = -np.inf
+    table[0x9FFE] = np.nan
+    return(table.astype(np.float32))
+
+FP2_LUT = FP2_table()
+
+def decodeFP2(values):
+    # Decode an array of raw FP2 codes (any byte order) to float32
+    return(FP2_LUT[np.asarray(values,dtype=np.uint16)])
+
+def rowStarts(buffer,blockSize=2**24):
+    # Byte offset of every complete row (terminated by a newline) in a uint8 buffer, scanned in blocks to bound memory
+    ends = [np.flatnonzero(buffer[first:first+blockSize] == 10)+first for first in range(0,buffer.shape[0],blockSize)]
+    ends = np.concatenate(ends) if len(ends) > 0 else np.zeros(0,dtype=np.int64)
+    return(np.concatenate([[0],ends[:-1]+1]).astype(np.int64) if ends.shape[0] > 0 else ends)
+
+def rowHeads(buffer,starts,width):
+    # The first width bytes of every row as an (n,width) uint8 matrix, zero padded past the end of the buffer
+    inside = starts <= buffer.shape[0]-width
+    if inside.all():
+        return(np.lib.stride_tricks.sliding_window_view(buffer,width)[starts])
+    heads = np.zeros((starts.shape[0],width),dtype=np.uint8)
+    if inside.any():
+        heads[inside] = np.lib.stride_tricks.sliding_window_view(buffer,width)[starts[inside]]
+    for row in np.flatnonzero(~inside):
+        tail = buffer[starts[row]:]
+        heads[row,:tail.shape[0]] = tail
+    return(heads)
+
+def campbellTimestamps(buffer,starts,name=None):
+    # Vectorized parse of the quoted timestamp that leads every TOA5 row: "YYYY-MM-DD HH:MM:SS[.fffffffff]"
+    # Works on the first bytes of each row, so no string object is created per row
+    # Returns None when any row does not follow the layout
+    heads = rowHeads(buffer,starts,31)
+    if not (heads[:,0] == 34).all():
+        return(None)
+    text = heads[:,1:]
+    # The closing quote follows the seconds or 1 to 9 fractional digits
+    close = np.argmax(text == 34,axis=1)
+    if not ((text[np.arange(text.shape[0]),close] == 34) & ((close == 19) | ((close > 20) & (text[:,19] == 46)))).all():
+        return(None)
+    if not (text[:,[4,7,10,13,16]] == np.frombuffer(b'-- ::',dtype=np.uint8)).all():
+        return(None)
+    digits = text[:,[0,1,2,3,5,6,8,9,11,12,14,15,17,18]]-np.uint8(48)
+    if (digits > 9).any():
+        return(None)
+    year = ((digits[:,0].astype(np.int64)*10+digits[:,1])*10+digits[:,2])*10+digits[:,3]
+    month,day,hour,minute,second = [digits[:,i].astype(np.int64)*10+digits[:,i+1] for i in range(4,14,2)]
+    nanoseconds = np.zeros(text.shape[0],dtype=np.int64)
+    for k in range(9):
+        digit = np.where(close > 20+k,text[:,20+k]-np.uint8(48),np.uint8(0))
+        if (digit > 9).any():
+            return(None)
+        nanoseconds += digit.astype(np.int64)*10**(8-k)
+    days = ((year-1970)*12+month-1).astype('datetime64[M]').astype('datetime64[D]')+(day-1)
+    Timestamp = days.astype('datetime64[ns]')+((hour*60+minute)*60+second)*np.timedelta64(1,'s')+nanoseconds*np.timedelta64(1,'ns')
+    return(pd.DatetimeIndex(Timestamp,name=name))
 
 @dataclass(kw_only=True)
 class asciiHeader(genericLoggerFile):
@@ -29,10 +105,11 @@ class asciiHeader(genericLoggerFile):
         self.preamble = self.parseLine(self.fileObject.readline())
         self.fileType = self.preamble[0]
         if self.fileType != self.__class__.__name__:
-            sys.exit(f"error: {__name__}.{self.__class__.__name__} does not support {self.sourceFile}")
+            raise ValueError(f"{__name__}.{self.__class__.__name__} does not support {self.sourceFile}")
         self.StationName=self.preamble[1]
         self.LoggerModel=self.preamble[2]
         self.SerialNo=self.preamble[3]
+        self.program=self.preamble[5]
         if self.fileType == 'TOA5':
             self.Table = self.preamble[-1]
             self.variableMap = updateDict(
@@ -46,7 +123,12 @@ class asciiHeader(genericLoggerFile):
                         self.parseLine(self.fileObject.readline()),
                     )},self.variableMap,overwrite=True)
             f = os.path.split(self.fileObject.name)[-1]
-            self.fileTimestamp = pd.to_datetime(datetime.datetime.strptime(re.search(r'([0-9]{4}\_[0-9]{2}\_[0-9]{2}\_[0-9]{4})', f.rsplit('.',1)[0]).group(0),'%Y_%m_%d_%H%M'))
+            stamp = re.search(r'([0-9]{4}\_[0-9]{2}\_[0-9]{2}\_[0-9]{4})', f.rsplit('.',1)[0])
+            if stamp is not None:
+                self.fileTimestamp = pd.to_datetime(datetime.datetime.strptime(stamp.group(0),'%Y_%m_%d_%H%M'))
+            else:
+                # Not named by CardConvert, fall back on the modification time
+                self.fileTimestamp = pd.to_datetime(os.path.getmtime(self.sourceFile),unit='s').floor('min')
         elif self.fileType == 'TOB3':
             # Get file metadata from header to facilitate parsing
             self.fileTimestamp = pd.to_datetime(self.preamble[-1])
@@ -71,6 +153,7 @@ class asciiHeader(genericLoggerFile):
                     )},self.variableMap,overwrite=True)
             dtype_map_struct = {"IEEE4B": "f","IEEE8B": "d","FP2": "H"}
             self.byteMap = ''.join([dtype_map_struct[var['dtype']] for var in self.variableMap.values()])
+            self.fp2Columns = [var for var,code in zip(self.variableMap,self.byteMap) if code == 'H']
             self.DataFrame = pd.DataFrame(columns=list(self.variableMap.keys())) 
         
     def parseLine(self,line):
@@ -81,135 +164,579 @@ class asciiHeader(genericLoggerFile):
 
 @dataclass(kw_only=True)
 class TOA5(asciiHeader):
+    fastPath: bool = field(default=True,repr=False)
+    # Resume an earlier ingest: only rows after lastByte are read, if the row ending there holds lastRecord
+    lastByte: int = field(default=None,repr=False)
+    lastRecord: int = field(default=None,repr=False)
 
     def __post_init__(self):
+        self.initArgs = {'variableMap':copy.deepcopy(self.variableMap),'dropCols':list(self.dropCols)}
         super().__post_init__()
         with open(self.sourceFile) as self.fileObject:
-            self.parseHeader()
-        self.DataFrame = pd.read_csv(self.sourceFile,header=None,skiprows=4)
-        self.DataFrame.columns = list(self.variableMap.keys())
-        self.DataFrame = self.DataFrame.set_index(pd.to_datetime(self.DataFrame[self.timestampName],format='ISO8601'))
-        self.DataFrame = self.DataFrame.drop(columns=[self.timestampName])
+            with self.stage('header'):
+                self.parseHeader()
+                self.typedColumns()
+                resumeByte,resumeRecord = self.lastByte,self.lastRecord
+                self.tailPosition()
+                resumeByte = self.resumePoint(resumeByte,resumeRecord)
+            if not self.extract:
+                with self.stage('span'):
+                    self.firstLast()
+                if resumeByte is not None:
+                    # update() reads on from the resume point
+                    self.lastByte = resumeByte
+            elif self.fastPath or resumeByte is not None:
+                start = self.dataOffset if resumeByte is None else resumeByte
+                with self.stage('read',bytes=self.lastByte-start) as record:
+                    # Rows up to lastByte, a half-written last line is read by update() once complete
+                    rows = np.zeros(0,dtype=np.uint8)
+                    if self.lastByte > start:
+                        rows = np.memmap(self.sourceFile,dtype=np.uint8,mode='r',offset=start,shape=(self.lastByte-start,))
+                    if resumeByte is None:
+                        self.DataFrame = self.readTyped(rows,source=self.sourceFile,skiprows=4)
+                    else:
+                        self.DataFrame = self.readTyped(rows)
+                    del rows
+                    record['rows'] = self.DataFrame.shape[0]
+        if self.extract and not self.fastPath and resumeByte is None:
+            with self.stage('read',bytes=self.lastByte) as record:
+                self.DataFrame = pd.read_csv(self.sourceFile,header=None,skiprows=4)
+                self.DataFrame.columns = list(self.variableMap.keys())
+                self.DataFrame = self.DataFrame.set_index(pd.to_datetime(self.DataFrame[self.timestampName],format='ISO8601'))
+                self.DataFrame = self.DataFrame.drop(columns=[self.timestampName])
+                record['rows'] = self.DataFrame.shape[0]
+        if self.extract or resumeByte is None:
+            self.lastIngested()
         self.standardize()
 
+    def typedColumns(self):
+        # dtypes to read columns with, set up front where the variableMap declares them (the rest are inferred by pandas)
+        # Ignored and dropped columns are not read, but kept in the variableMap as ignored variables
+        self.readColumns = list(self.variableMap.keys())
+        self.readDtypes = {}
+        for column in self.readColumns:
+            var = self.variableMap[column]
+            if var.get('ignore') or column in self.dropCols or re.sub('[^0-9a-zA-Z]+',_variableMap.fillChar,column) in self.dropCols:
+                var.update({'title':column,'ignore':True})
+                continue
+            if column == self.timestampName:
+                self.readDtypes[column] = str
+            else:
+                declared = var.get('dtype')
+                self.readDtypes[column] = None if declared is None else _variableMap.dtype_map_numpy.get(declared,declared)
+
+    def readTyped(self,data,source=None,skiprows=0):
+        # Read complete data rows (bytes or a uint8 array), skipping ignored columns
+        # source is where read_csv finds the same rows (the file itself for a whole file read), data by default
+        # The fast path parses the timestamps straight from the bytes and read_csv leaves the timestamp column out
+        buffer = data if isinstance(data,np.ndarray) else np.frombuffer(data,dtype=np.uint8)
+        starts = rowStarts(buffer)
+        if starts.shape[0] == 0:
+            return(pd.DataFrame(columns=[c for c in self.readDtypes if c != self.timestampName],index=pd.DatetimeIndex([],name=self.timestampName)))
+        index = campbellTimestamps(buffer,starts,name=self.timestampName) if self.fastPath else None
+        usecols = [column for column in self.readDtypes if index is None or column != self.timestampName]
+        def read(dtype):
+            return(pd.read_csv(io.BytesIO(data) if source is None else source,header=None,names=self.readColumns,
+                               usecols=usecols,dtype=dtype,skiprows=skiprows,nrows=starts.shape[0]))
+        try:
+            DataFrame = read({column:dtype for column,dtype in self.readDtypes.items() if dtype is not None and column in usecols})
+        except ValueError:
+            # Values that don't fit a declared dtype (e.g. NAN in an integer column): let pandas infer every column
+            DataFrame = read({self.timestampName:str} if index is None else None)
+        if index is None:
+            index = pd.DatetimeIndex(pd.to_datetime(DataFrame.pop(self.timestampName),format='ISO8601'),name=self.timestampName)
+        DataFrame.index = index
+        return(DataFrame)
+
+    def iter_chunks(self,chunksize=10**6):
+        # Stream the data rows as DataFrame chunks of (at most) chunksize rows, use with extract=False to skip the full read
+        # The variableMap is the one built in __post_init__, a half-written last line is left out
+        with open(self.sourceFile) as f:
+            for _ in range(4):
+                f.readline()
+            while True:
+                lines = [line for line in itertools.islice(f,chunksize) if line.endswith('\n')]
+                if len(lines) == 0:
+                    break
+                with self.stage('read',bytes=sum(map(len,lines))) as record:
+                    chunk = self.readTyped(''.join(lines).encode())
+                    record['rows'] = chunk.shape[0]
+                yield(self.processChunk(chunk))
+
+    def firstLast(self):
+        # Header-only pass: parse the first two and the last complete rows,
+        # the frequency comes from the first two and DataFrame keeps the first and last
+        lines = [line for line in headLines(self.fileObject,2) if line.endswith('\n')]
+        if len(lines) > 0:
+            last = tailLines(self.sourceFile,1)[0].decode('utf-8',errors='replace')
+            if last not in lines:
+                lines.append(last)
+        if len(lines) == 0:
+            self.DataFrame = pd.DataFrame(columns=[c for c in self.readDtypes if c != self.timestampName],index=pd.DatetimeIndex([],name=self.timestampName))
+            return
+        self.DataFrame = self.readTyped(''.join(lines).encode())
+        if self.DataFrame.shape[0] > 1:
+            self.frequency = f"{(self.DataFrame.index[1]-self.DataFrame.index[0]).total_seconds()}s"
+            self.DataFrame = self.DataFrame.iloc[[0,-1]]
+
+    def tailPosition(self):
+        # Remember where the complete rows end, so update() can pick up from there
+        stat = os.stat(self.sourceFile)
+        self.fileId = (stat.st_dev,stat.st_ino)
+        with open(self.sourceFile,'rb') as f:
+            # Data rows start after the four header lines
+            for _ in range(4):
+                f.readline()
+            self.dataOffset = f.tell()
+            self.lastByte = stat.st_size
+            f.seek(max(self.lastByte-1,0))
+            self.partialLine = self.lastByte > 0 and f.read(1) != b'\n'
+            while self.partialLine and self.lastByte > 0:
+                start = max(self.lastByte-4096,0)
+                f.seek(start)
+                block = f.read(self.lastByte-start)
+                self.lastByte = start
+                if b'\n' in block:
+                    self.lastByte += block.rindex(b'\n')+1
+                    break
+
+    def resumePoint(self,lastByte,lastRecord):
+        # Check a lastByte (and lastRecord) passed in: it has to end a complete data row within the file,
+        # and that row has to hold lastRecord. Anything else is logged and the file is read from the start
+        self.lastTimestamp,self.lastRecord = None,None
+        if lastByte is None:
+            return(None)
+        if lastByte == self.dataOffset and lastRecord is None:
+            return(lastByte)
+        row = []
+        if self.dataOffset < lastByte <= self.lastByte:
+            with open(self.sourceFile,'rb') as f:
+                f.seek(lastByte-1)
+                if f.read(1) == b'\n':
+                    row = tailLines(self.sourceFile,1,end=lastByte)
+        if len(row) == 1 and lastByte-len(row[0]) >= self.dataOffset:
+            row = self.readTyped(row[0])
+            if lastRecord is None or ('RECORD' in row.columns and int(row['RECORD'].iloc[-1]) == lastRecord):
+                self.lastTimestamp,self.lastRecord = row.index[-1],lastRecord
+                return(lastByte)
+        log(f"{self.sourceFile} does not match lastByte={lastByte}, lastRecord={lastRecord}, parsing from the start",verbose=self.verbose)
+        return(None)
+
+    def lastIngested(self):
+        # The last ingested row, the resume point is kept when no new rows were read
+        if self.DataFrame.shape[0]>0:
+            self.lastTimestamp = self.DataFrame.index[-1]
+            self.lastRecord = None
+            if 'RECORD' in self.DataFrame.columns:
+                self.lastRecord = int(self.DataFrame['RECORD'].iloc[-1])
+
+    def update(self):
+        # Incremental ingest of rows appended since the last pass, reusing the parsed header and variableMap
+        # self.DataFrame is replaced by the new rows (which are also returned)
+        # A file that was truncated or replaced (rotated) is parsed again from the start
+        stat = os.stat(self.sourceFile)
+        if (stat.st_dev,stat.st_ino) != self.fileId or stat.st_size < self.lastByte:
+            log(f"{self.sourceFile} was rotated or truncated, parsing from the start",verbose=self.verbose)
+            fresh = type(self)(sourceFile=self.sourceFile,timezone=self.timezone,timestampName=self.timestampName,
+                verbose=self.verbose,fastPath=self.fastPath,instrument=self.instrument,diagnostics=self.diagnostics,
+                packFlags=self.packFlags,compact=self.compact,**copy.deepcopy(self.initArgs))
+            self.__dict__.update(fresh.__dict__)
+            return(self.DataFrame)
+        with open(self.sourceFile,'rb') as f:
+            f.seek(self.lastByte)
+            appended = f.read(stat.st_size-self.lastByte)
+        complete = appended.rfind(b'\n')+1
+        if complete == 0:
+            self.DataFrame = self.DataFrame.iloc[:0]
+            return(self.DataFrame)
+        with self.stage('update',bytes=complete) as record:
+            DataFrame = self.readTyped(appended[:complete])
+            record['rows'] = DataFrame.shape[0]
+        self.lastByte += complete
+        # Skip rows already ingested, keeping rows after a logger RECORD reset
+        keep = np.ones(DataFrame.shape[0],dtype=bool)
+        if self.lastTimestamp is not None:
+            keep = DataFrame.index > self.lastTimestamp
+            if self.lastRecord is not None and 'RECORD' in DataFrame.columns:
+                keep |= DataFrame['RECORD'].values > self.lastRecord
+        self.DataFrame = self.processChunk(DataFrame.loc[keep])
+        if self.DataFrame.shape[0]>0:
+            self.lastIngested()
+        return(self.DataFrame)
+
 @dataclass(kw_only=True)
 class TOB3(asciiHeader):
-    extract: bool = True
     campbellBaseTime: float = pd.to_datetime('1990-01-01').timestamp()
+    indexFile: str = field(default=None,repr=False)
+    workers: int = field(default=None,repr=False)
+    resync: bool = field(default=False,repr=False)
+    skippedRanges: list = field(default_factory=lambda:[],repr=False)
+    # Never written (zero-filled) frames after the last frame of a card that hasn't wrapped, not counted as skipped
+    unusedRanges: list = field(default_factory=lambda:[],repr=False)
+    frameIndex: np.ndarray = field(default=None,repr=False)
 
     def __post_init__(self):
         super().__post_init__()
         self.fileSize = os.path.getsize(self.sourceFile)
+        if self.indexFile is None:
+            self.indexFile = f"{self.sourceFile}.idx.npz"
+        self.standardized = False
         with open(self.sourceFile,'rb') as self.fileObject:
-            self.parseHeader()
+            with self.stage('header'):
+                self.parseHeader()
+                self.frameLayout()
             if self.extract:
-                self.readFrames()
+                with self.stage('decode',bytes=self.fileSize-self.dataOffset) as record:
+                    self.readFrames()
+                    record['rows'] = self.DataFrame.shape[0]
                 self.standardize()
+                self.standardized = True
+            else:
+                with self.stage('span'):
+                    self.firstLast()
+                # The variableMap is built as iter_chunks would, so it matches a full parse
+                rows = self.DataFrame
+                self.standardizeOnce(rows)
+                self.DataFrame = self.processChunk(rows)
         self.fileObject.close()
-            
-    def readFrames(self):
+
+    def frameLayout(self):
+        # Fixed frame geometry, the header ends where the first frame begins
         self.headerSize = 12
         self.footerSize = 4
+        self.dataOffset = self.fileObject.tell()
         self.recordSize = struct.calcsize('>'+self.byteMap)
         self.recordsPerFrame = int((self.frameSize-self.headerSize-self.footerSize)/self.recordSize)
+        self.recordInterval = self.frequency
+        self.frameDtype = self.buildFrameDtype()
+            
+    def firstLast(self,maxFrames=16):
+        # Header-only pass: DataFrame keeps the first and last valid records
+        # Footers are checked in growing windows from each end until a valid record turns up (card files can end in unused frames)
+        self.frequency = f"{self.recordInterval}s"
+        nframes = int((self.fileSize-self.dataOffset)/self.frameSize)
+        ends = []
+        for forward in [True,False]:
+            n,done = maxFrames,0
+            while done < nframes:
+                n = min(n,nframes-done)
+                first = done if forward else nframes-done-n
+                self.fileObject.seek(self.dataOffset+first*self.frameSize)
+                frames = np.frombuffer(self.fileObject.read(n*self.frameSize),dtype=self.frameDtype,count=n)
+                valid = self.decode_footer(frames)
+                if valid.any():
+                    # Only the first (or last) valid record of the window is decoded
+                    pick = np.zeros(valid.size,dtype=bool)
+                    pick[np.flatnonzero(valid)[0 if forward else -1]] = True
+                    pick = pick.reshape(valid.shape)
+                    ends.append((self.decode_header(frames)[pick],self.decode_body(frames,pick)))
+                    break
+                done += n
+                n *= 2
+        if len(ends) == 0:
+            self.DataFrame = self.decodeFrames(b'',0)
+        else:
+            self.DataFrame = self.assembleFrames(np.concatenate([Timestamp for Timestamp,_ in ends]),
+                {var:np.concatenate([Body[var] for _,Body in ends]) for var in ends[0][1]})
+
+    def readFrames(self):
         nframes = int((self.fileSize-self.fileObject.tell())/self.frameSize)
-        self.byteMap_Body = '>'+''.join([self.byteMap for r in range(self.recordsPerFrame)])
-        
-        # unpack the binary data and parse all the frames with list comprehension
-        bindata = self.fileObject.read()
-        frames = [
-            [
-                # Headers
-                self.decode_header(bindata[i*self.frameSize:i*self.frameSize+self.headerSize]),
-                # Body
-                self.decode_body(bindata[i*self.frameSize+self.headerSize:(i+1)*self.frameSize-self.footerSize]),
-                # Footers    
-                self.decode_footer(bindata[(i+1)*self.frameSize-self.footerSize:(i+1)*self.frameSize])
-                ]
-            for i in range(nframes)]
-        frames = [frame[0][i]+frame[1][i] for j,frame in enumerate(frames) for i in range(self.recordsPerFrame) if frame[2][i][0]]
-        self.DataFrame = pd.DataFrame(frames,
-            columns=[self.timestampName]+[var for var in self.variableMap]) 
-        self.DataFrame.index = pd.to_datetime(self.DataFrame[self.timestampName],unit='s')
-        self.frequency = f"{self.frequency}s"
-        self.DataFrame.index = self.DataFrame.index.round(self.frequency)
+        # view the binary data as an array of frames and decode all frames at once
+        self.frequency = f"{self.recordInterval}s"
+        if self.resync:
+            self.DataFrame = self.decodeFrames(*self.scanFrames(self.fileObject.read()))
+        elif self.workers is not None and self.workers > 1 and nframes > 1:
+            self.DataFrame = self.decodeParallel(nframes)
+        else:
+            bindata = self.fileObject.read()
+            self.DataFrame = self.decodeFrames(bindata,nframes)
+
+    def scanFrames(self,bindata):
+        # Recover frame boundaries from the raw data region by searching for footer validation stamps
+        # Returns the re-aligned frame bytes and frame count, skipped byte ranges go to self.skippedRanges
+        # and the unused region at the end of a card that hasn't wrapped to self.unusedRanges
+        # A candidate frame is accepted when it sits on the regular frame grid, when a neighbouring candidate sits one
+        # frame away or when it is the last frame, so a chance match of the 16-bit stamp inside corrupt data is not mistaken for a frame
+        raw = np.frombuffer(bindata,dtype=np.uint8)
+        self.skippedRanges,self.unusedRanges = [],[]
+        if raw.shape[0] >= self.frameSize:
+            match = (raw[2:-1] == (self.val_stamp & 0xFF)) & (raw[3:] == (self.val_stamp >> 8))
+            starts = np.nonzero(match)[0]+self.footerSize-self.frameSize
+            starts = starts[(starts >= 0) & (starts+self.frameSize <= raw.shape[0])]
+            neighbour = np.isin(starts+self.frameSize,starts) | np.isin(starts-self.frameSize,starts)
+            starts = starts[neighbour | (starts % self.frameSize == 0) | (starts+2*self.frameSize > raw.shape[0])]
+        else:
+            starts = np.zeros(0,dtype=np.int64)
+        if (np.diff(starts) < self.frameSize).any():
+            # Drop candidates overlapping an accepted frame
+            keep,end = [],0
+            for s in starts:
+                if s >= end:
+                    keep.append(s)
+                    end = s+self.frameSize
+            starts = np.array(keep,dtype=np.int64)
+        gaps = np.nonzero(np.append(starts,raw.shape[0]) > np.insert(starts+self.frameSize,0,0))[0]
+        for i in gaps:
+            start = 0 if i == 0 else int(starts[i-1])+self.frameSize
+            end = raw.shape[0] if i == starts.shape[0] else int(starts[i])
+            if i == starts.shape[0] and (end-start) % self.frameSize == 0:
+                # Zero-filled frames at the end were never written, only what comes before them is skipped
+                written = np.flatnonzero(raw[start:end].reshape(-1,self.frameSize).any(axis=1))
+                unused = start+(0 if written.shape[0] == 0 else int(written[-1]+1)*self.frameSize)
+                if unused < end:
+                    self.unusedRanges.append({'start':self.dataOffset+unused,'end':self.dataOffset+end,'bytes':end-unused})
+                    end = unused
+                if end == start:
+                    continue
+            self.skippedRanges.append({'start':self.dataOffset+start,'end':self.dataOffset+end,'bytes':end-start})
+            log(f"Skipped {end-start} bytes at offset {self.dataOffset+start} in {self.sourceFile}",verbose=self.verbose)
+        if starts.shape[0] > 0 and (starts == starts[0]+np.arange(starts.shape[0])*self.frameSize).all():
+            return(raw[starts[0]:starts[0]+starts.shape[0]*self.frameSize],starts.shape[0])
+        return(raw[starts[:,np.newaxis]+np.arange(self.frameSize)],starts.shape[0])
+
+    def decodeParallel(self,nframes):
+        # Split the frame region into contiguous frame ranges decoded by a process pool
+        # Workers write every record slot into shared-memory column buffers, 
+        # the validity mask is applied once all ranges are done so records stay in frame order
+        # Buffers are (role, column, dtype), workers pick what to decode into each by its role, not by column name
+        nrecords = nframes*self.recordsPerFrame
+        columns = [('timestamp',None,np.int64 if self.compact else np.float64),('valid',None,np.bool_),('record','RECORD',np.int64)]+[
+            ('fp2' if code == 'H' else 'body',var,np.float64 if code == 'd' else np.float32) for var,code in zip(self.variableMap,self.byteMap)]
+        buffers = [shared_memory.SharedMemory(create=True,size=max(nrecords*np.dtype(dtype).itemsize,1)) for _,_,dtype in columns]
+        layout = [(role,var,buffer.name,np.dtype(dtype).str) for (role,var,dtype),buffer in zip(columns,buffers)]
+        settings = {'timestampName':self.timestampName,'variableMap':self.variableMap,'dropCols':self.dropCols,'compact':self.compact}
+        try:
+            bounds = np.linspace(0,nframes,min(self.workers,nframes)+1).astype(int)
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                jobs = [pool.submit(decodeFrameRange,self.sourceFile,self.campbellBaseTime,first,last,nrecords,layout,settings) 
+                        for first,last in zip(bounds[:-1],bounds[1:]) if last>first]
+                for job in jobs:
+                    job.result()
+            arrays = [np.ndarray(nrecords,dtype=dtype,buffer=buffer.buf) for (_,_,dtype),buffer in zip(columns,buffers)]
+            valid = arrays[1]
+            DataFrame = self.assembleFrames(arrays[0][valid],{var:values[valid] for (_,var,_),values in zip(columns[2:],arrays[2:])})
+            del arrays,valid
+        finally:
+            for buffer in buffers:
+                buffer.close()
+                buffer.unlink()
+        return(DataFrame)
+
+    def iter_chunks(self,frames_per_chunk=1000):
+        # Stream the file as DataFrame chunks of (at most) frames_per_chunk frames
+        # Only one block of raw bytes and one chunk are held in memory at a time
+        self.frequency = f"{self.recordInterval}s"
+        with open(self.sourceFile,'rb') as f:
+            f.seek(self.dataOffset)
+            while True:
+                bindata = f.read(frames_per_chunk*self.frameSize)
+                nframes = int(len(bindata)/self.frameSize)
+                if nframes == 0:
+                    break
+                with self.stage('decode',bytes=len(bindata)) as record:
+                    chunk = self.decodeFrames(bindata,nframes)
+                    record['rows'] = chunk.shape[0]
+                self.standardizeOnce(chunk)
+                yield(self.processChunk(chunk))
+
+    def standardizeOnce(self,chunk):
+        # Build the variableMap once, from an empty slice with the chunk dtypes
+        if not self.standardized:
+            self.DataFrame = chunk.iloc[:0]
+            self.standardize()
+            self.standardized = True
+
+    def buildIndex(self,save=False):
+        # Compact per-frame index: byte offset, frame start time (POSIX seconds) and footer validity
+        # Frames are read through a memory map, only their header and footer are touched
+        # An existing sidecar index is reused, and extended when the file has grown since it was written,
+        # as long as the file header and the first and last indexed frames are unchanged
+        indexDtype = np.dtype([('offset','<i8'),('timestamp','<f8'),('valid','?')])
+        self.fileSize = os.path.getsize(self.sourceFile)
+        nframes = int((self.fileSize-self.dataOffset)/self.frameSize)
+        self.frameIndex = np.zeros(0,dtype=indexDtype)
+        if os.path.isfile(self.indexFile):
+            with np.load(self.indexFile) as saved:
+                layout = [int(saved[key]) for key in ['dataOffset','frameSize','val_stamp']]
+                if (layout == [self.dataOffset,self.frameSize,self.val_stamp] and saved['index'].shape[0] <= nframes and
+                    'identity' in saved and str(saved['identity']) == self.indexIdentity(saved['index'].shape[0])):
+                    self.frameIndex = saved['index']
+        start = self.frameIndex.shape[0]
+        if nframes > start:
+            headerFooter = np.dtype({
+                'names':['header','footer'],
+                'formats':[('<u4',3),'<u4'],
+                'offsets':[0,self.frameSize-self.footerSize],
+                'itemsize':self.frameSize
+                })
+            frames = np.memmap(self.sourceFile,dtype=headerFooter,mode='r',
+                offset=self.dataOffset+start*self.frameSize,shape=(nframes-start,))
+            newFrames = np.zeros(nframes-start,dtype=indexDtype)
+            newFrames['offset'] = self.dataOffset+(start+np.arange(nframes-start,dtype=np.int64))*self.frameSize
+            newFrames['timestamp'] = frames['header'][:,0]+frames['header'][:,1]*self.frameTime+self.campbellBaseTime
+            newFrames['valid'] = ((0xFFFF0000 & frames['footer']) >> 16) == self.val_stamp
+            del frames
+            self.frameIndex = np.concatenate([self.frameIndex,newFrames])
+            if save:
+                with open(self.indexFile,'wb') as f:
+                    np.savez(f,index=self.frameIndex,dataOffset=self.dataOffset,frameSize=self.frameSize,val_stamp=self.val_stamp,
+                             identity=self.indexIdentity(self.frameIndex.shape[0]))
+        return(self.frameIndex)
+
+    def indexIdentity(self,nframes):
+        # Hash of the file header and the header and footer of the first and last of nframes indexed frames
+        sha = hashlib.sha1()
+        with open(self.sourceFile,'rb') as f:
+            sha.update(f.read(self.dataOffset))
+            for frame in sorted({0,nframes-1}) if nframes > 0 else []:
+                f.seek(self.dataOffset+frame*self.frameSize)
+                sha.update(f.read(self.headerSize))
+                f.seek(self.dataOffset+(frame+1)*self.frameSize-self.footerSize)
+                sha.update(f.read(self.footerSize))
+        return(sha.hexdigest())
+
+    def read_range(self,start,end):
+        # Decode only the frames overlapping [start, end], located by binary search on the frame index
+        if self.frameIndex is None or self.frameIndex.shape[0]<int((os.path.getsize(self.sourceFile)-self.dataOffset)/self.frameSize):
+            self.buildIndex()
+        start,end = pd.Timestamp(start),pd.Timestamp(end)
+        frames = self.frameIndex[self.frameIndex['valid']]
+        frames = frames[np.argsort(frames['timestamp'],kind='stable')]
+        frameDuration = self.recordsPerFrame*self.recordInterval
+        lo = np.searchsorted(frames['timestamp'],start.timestamp()-frameDuration,side='right')
+        hi = np.searchsorted(frames['timestamp'],end.timestamp(),side='right')
+        offsets = np.sort(frames['offset'][lo:hi])
+        chunks = []
+        with open(self.sourceFile,'rb') as f:
+            # Read each run of consecutive frames in one go
+            for run in np.split(offsets,np.nonzero(np.diff(offsets)!=self.frameSize)[0]+1):
+                if run.shape[0] == 0:
+                    continue
+                f.seek(run[0])
+                chunks.append(self.decodeFrames(f.read(run.shape[0]*self.frameSize),run.shape[0]))
+        if len(chunks) == 0:
+            chunks = [self.decodeFrames(b'',0)]
+        DataFrame = pd.concat(chunks)
+        self.standardizeOnce(DataFrame)
+        return(self.processChunk(DataFrame.loc[(DataFrame.index>=start)&(DataFrame.index<=end)]))
+
+    def decodeFrames(self,bindata,nframes):
+        frames = np.frombuffer(bindata,dtype=self.frameDtype,count=nframes)
+        valid = self.decode_footer(frames)
+        Timestamp = self.decode_header(frames)
+        return(self.assembleFrames(Timestamp[valid],self.decode_body(frames,valid)))
+
+    def assembleFrames(self,Timestamp,Body):
+        # Timestamped DataFrame from the decoded (valid) records
+        with self.stage('assemble',rows=Timestamp.shape[0]):
+            return(self.buildDataFrame(Timestamp,Body))
+
+    def buildDataFrame(self,Timestamp,Body):
+        DataFrame = pd.DataFrame({self.timestampName:Timestamp}|Body)
+        DataFrame.index = pd.to_datetime(DataFrame[self.timestampName],unit='ns' if self.compact else 's')
+        DataFrame.index = DataFrame.index.round(f"{self.recordInterval}s")
         # Remove implausible timestamps???
-        # self.DataFrame = self.DataFrame.loc[self.DataFrame.index<self.fileTimestamp+pd.to_timedelta(self.frequency)]
-        self.typeMap = 'd'+self.byteMap.replace('H','f')
-        self.typeMap = {c:self.typeMap[i] for i,c in enumerate(self.DataFrame.columns)}
-        self.DataFrame = self.DataFrame.astype(self.typeMap) 
+        # DataFrame = DataFrame.loc[DataFrame.index<self.fileTimestamp+pd.to_timedelta(self.frequency)]
+        self.typeMap = ('q' if self.compact else 'd')+'q'+self.byteMap.replace('H','f')
+        self.typeMap = {c:self.typeMap[i] for i,c in enumerate(DataFrame.columns)}
+        return(DataFrame.astype(self.typeMap))
+
+    def buildFrameDtype(self):
+        # Structured dtype for one frame: little-endian header (seconds, subseconds, record), 
+        # recordsPerFrame big-endian records and the little-endian footer at the end of the frame
+        record = np.dtype([(var,'>'+self.byteMap[i]) for i,var in enumerate(self.variableMap)])
+        return(np.dtype({
+            'names':['header','body','footer'],
+            'formats':[('<u4',3),(record,self.recordsPerFrame),'<u4'],
+            'offsets':[0,self.headerSize,self.frameSize-self.footerSize],
+            'itemsize':self.frameSize
+            }))
         
-    def decode_header(self,Header):
-        # Get the timestamp from the header
-        Header = struct.unpack('LLL', Header)
-        Timestamp = Header[0]+Header[1]*self.frameTime+self.campbellBaseTime
-        Timestamp = [[Timestamp + i*self.frequency] for i in range(self.recordsPerFrame)]
+    def decode_header(self,frames):
+        # Get the timestamp of every record from the frame headers
+        Header = frames['header']
+        if self.compact:
+            # Integer epoch nanoseconds, without going through float seconds
+            ns = lambda seconds: np.int64(round(seconds*10**9))
+            Timestamp = Header[:,0].astype(np.int64)*10**9+Header[:,1].astype(np.int64)*ns(self.frameTime)+ns(self.campbellBaseTime)
+            return(Timestamp[:,np.newaxis]+np.arange(self.recordsPerFrame,dtype=np.int64)*ns(self.recordInterval))
+        Timestamp = Header[:,0]+Header[:,1]*self.frameTime+self.campbellBaseTime
+        Timestamp = Timestamp[:,np.newaxis]+np.arange(self.recordsPerFrame)*self.recordInterval
         return(Timestamp)
 
-    def decode_body(self,Body):
-        Body = struct.unpack(self.byteMap_Body, Body)
-        if 'H' in self.byteMap_Body:
-            Body = self.decode_fp2(Body)
-        Body = list(Body)
-        npr = int(len(Body)/self.recordsPerFrame)
-        Body = [Body[i*npr:(i+1)*npr] for i in range(self.recordsPerFrame)]
+    def decode_record(self,frames):
+        # Record number of every record, the frame header holds the number of the frame's first record
+        return(frames['header'][:,2].astype(np.int64)[:,np.newaxis]+np.arange(self.recordsPerFrame,dtype=np.int64))
+
+    def decode_body(self,frames,valid):
+        # Column arrays of the valid records: RECORD, then the variables in variableMap order
+        Body = {'RECORD':self.decode_record(frames)[valid]}|{var:frames['body'][var][valid] for var in frames.dtype['body'].base.names}
+        for var in self.fp2Columns:
+            Body[var] = decodeFP2(Body[var])
         return(Body)
     
-    def decode_footer(self,Footer):
-        # True/False flag for valid frame
+    def decode_footer(self,frames):
+        # True/False flag for valid records in each frame
         # Adapted from https://github.com/ansell/camp2ascii/blob/cea750fb721df3d3ccc69fe7780b372d20a8160d/frame_read.c#L109
-        Footer = struct.unpack('L',Footer)[0]
+        Footer = frames['footer']
         footerOffset     = (0x000007FF & Footer)
         footerValidation = (0xFFFF0000 & Footer) >> 16
         Footer = (footerValidation == self.val_stamp)
-        # For handling partial frames
-        if footerOffset > 0:
-            offset = int(self.recordSize/(self.frameSize-(footerOffset+self.headerSize+self.footerSize)))
-        else:
-            offset = self.recordsPerFrame
-        Footer = [[Footer] if i < offset else [False] for i in range(self.recordsPerFrame)]
+        # For handling partial frames, the offset is the number of unused bytes at the end of the frame body
+        offset = (self.frameSize-self.headerSize-self.footerSize-footerOffset.astype(np.int64))//self.recordSize
+        Footer = Footer[:,np.newaxis] & (np.arange(self.recordsPerFrame) < offset[:,np.newaxis])
         return(Footer)
 
-    def decode_fp2(self,Body):
-        # adapted from: https://github.com/ansell/camp2ascii/tree/cea750fb721df3d3ccc69fe7780b372d20a8160d
-        def FP2_map(int):
-            sign = (0x8000 & int) >> 15
-            exponent =  (0x6000 & int) >> 13 
-            mantissa = (0x1FFF & int)       
-            if exponent == 0: 
-                Fresult=mantissa
-            elif exponent == 1:
-                Fresult=mantissa*1e-1
-            elif exponent == 2:
-                Fresult=mantissa*1e-2
+def decodeFrameRange(sourceFile,campbellBaseTime,first,last,nrecords,layout,settings={}):
+    # Process pool worker for TOB3.decodeParallel: decode frames [first, last) into the shared column buffers
+    # settings carries the parent's timestampName, variableMap, dropCols and compact so both read the same frame layout
+    tob3 = TOB3(sourceFile=sourceFile,campbellBaseTime=campbellBaseTime,extract=False,**settings)
+    buffers = [shared_memory.SharedMemory(name=name) for _,_,name,_ in layout]
+    try:
+        with open(sourceFile,'rb') as f:
+            f.seek(tob3.dataOffset+first*tob3.frameSize)
+            frames = np.frombuffer(f.read((last-first)*tob3.frameSize),dtype=tob3.frameDtype,count=last-first)
+        records = slice(first*tob3.recordsPerFrame,last*tob3.recordsPerFrame)
+        for (role,var,_,dtype),buffer in zip(layout,buffers):
+            out = np.ndarray(nrecords,dtype=dtype,buffer=buffer.buf)
+            if role == 'valid':
+                out[records] = tob3.decode_footer(frames).ravel()
+            elif role == 'timestamp':
+                out[records] = tob3.decode_header(frames).ravel()
+            elif role == 'record':
+                out[records] = tob3.decode_record(frames).ravel()
+            elif role == 'fp2':
+                out[records] = decodeFP2(frames['body'][var].ravel())
             else:
-                Fresult=mantissa*1e-3
-
-            if sign != 0:
-                Fresult*=-1
-            return Fresult
-        FP2_ix = [m.start() for m in re.finditer('H', self.byteMap_Body.replace('>','').replace('<',''))]
-        Body = list(Body)
-        for ix in FP2_ix:
-            Body[ix] = FP2_map(Body[ix])
-        return(Body)
+                out[records] = frames['body'][var].ravel()
+            del out
+    finally:
+        for buffer in buffers:
+            buffer.close()
+
+@dataclass(kw_only=True)
+class mixedArrayTable(asciiHeader):
+    # One array ID of a mixed array, built directly from the parsed values
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.standardize()
 
 @dataclass(kw_only=True)
 class mixedArray():
-    # Converts a mixed array to a TOA5 file for standardized processing
+    # Parses each array ID of a mixed array into a standardized table
     DAT_file: str = field(repr=False) 
     DEF_file: str = field(repr=False)
     ArrayDefs: dict = field(default_factory=lambda: {'Timestamp': '', 'Program': '', 'Model': '', 'Table': {}}, repr=False)
     Tables: dict = field(default_factory=lambda: {}, repr=False)
     verbose: bool = field(default=False, repr=False)
     saveTOA5: bool = field(default=False, repr=False)
+    instrument: instrument = field(default=None, repr=False)
+    extract: bool = field(default=True, repr=False)
 
     def __post_init__(self):
-        # read the mixed array
-        f = open(self.DAT_file, 'r', encoding='utf-8-sig')
-        self.MA = [l.rstrip('\n').split(',') for l in f.readlines()]
-        f.close()
         # read the DEF file
+        stage = lambda name,**kwds: nullStage() if self.instrument is None else self.instrument.stage(name,file=self.DAT_file,parser='mixedArray',**kwds)
         f = open(self.DEF_file, 'r', encoding='utf-8-sig')
         self.DEF = f.readlines()
         f.close()
@@ -251,50 +778,76 @@ class mixedArray():
                 self.ArrayDefs['Table'][arrID]['variableMap'][name] = {}
                 self.ArrayDefs['Table'][arrID]['variableMap'][name]['units'] = name.replace('_'+operation,'')
                 self.ArrayDefs['Table'][arrID]['variableMap'][name]['variableDescription'] = operation
-        rowCT = {}
-        TOA5_string = {}
-        for arrID in self.ArrayDefs['Table']:
-            rowCT[arrID] = 1
-            # Arbitrary junk header
-            TOA5_string[arrID] = f'"TOA5","","{self.ArrayDefs["Model"]}","","","{self.ArrayDefs["Program"]}","","{arrID}"\n'
-            row = ['"TIMESTAMP"','"RECORD"']
-            for i,name in enumerate(self.ArrayDefs['Table'][arrID]['variableMap']):
-                if i>3:
-                    row.append(f'"{name}"')
-            TOA5_string[arrID] = TOA5_string[arrID] + ','.join(row) + '\n'
-            row = ['"TS"','"RN"']
-            for i,name in enumerate(self.ArrayDefs['Table'][arrID]['variableMap'].values()):
-                if i>3:
-                    row.append(f'"{name["units"]}"')
-            TOA5_string[arrID] = TOA5_string[arrID] + ','.join(row) + '\n'
-            row = ['","','"SMP"']
-            for i,name in enumerate(self.ArrayDefs['Table'][arrID]['variableMap'].values()):
-                if i>3:
-                    row.append(f'"{name["variableDescription"]}"')
-            TOA5_string[arrID] = TOA5_string[arrID] + ','.join(row) + '\n'
-        for row in self.MA:
-            if len(row) != len(self.ArrayDefs['Table'][row[0]]['variableMap']):
-                if self.verbose:
-                    print(f"Warning: Row length mismatch in mixed array for {row[0]}: {len(row)} vs {len(self.ArrayDefs['Table'][row[0]]['variableMap'])}")
-                pass
-            newRow = [str(s) for s in [self.parseDates(row),rowCT[arrID] ]+[float(f) for f in row[4:]]]
-            TOA5_string[arrID] = TOA5_string[arrID] + ','.join(newRow) + '\n'
-            rowCT[arrID] += 1
+        # read the mixed array in one pass, short rows are padded with NaN
+        width = max(len(arr['variableMap']) for arr in self.ArrayDefs['Table'].values())
+        with stage('read',bytes=os.path.getsize(self.DAT_file)) as record:
+            if self.extract:
+                MA = pd.read_csv(self.DAT_file,header=None,names=range(width),encoding='utf-8-sig',dtype=np.float64).values
+            else:
+                MA = self.firstLast(width)
+            record['rows'] = MA.shape[0]
+        arrayIDs = MA[:,0].astype(np.int64)
         self.dOuts = {}
-        for name,file in TOA5_string.items():
-            sourceFile = self.DAT_file.split('.')[0] + f'_ArrayID{name}_{datetime.datetime.now().strftime("%Y_%m_%d_%H%M")}.dat'
-            with open(sourceFile,'w') as f:
-                f.write(file)
-            self.dOuts[name] = TOA5(sourceFile=sourceFile)
-            if not self.saveTOA5:
-                os.remove(sourceFile)
-
-    def parseDates(self,row):
-        Date = ' '.join([str(int(D)) for D in row[1:3]])
-        Date = pd.to_datetime(Date,format = '%Y %j')
-        Time = str(int(row[3])).zfill(4).ljust(6,'0')
-        Time = Time[:2]+':'+Time[2:4]+':'+Time[4:]
-        Time = pd.to_timedelta(Time)
-        Timestamp = Date + Time
-        return(Timestamp.strftime('%Y-%m-%d %H:%M:%S'))
-            
\ No newline at end of file
+        for arrID,arr in self.ArrayDefs['Table'].items():
+            names = list(arr['variableMap'].keys())
+            rows = MA[arrayIDs == int(arrID),:len(names)]
+            if not self.extract and rows.shape[0] > 2:
+                rows = rows[[0,-1]]
+            if self.verbose and np.isnan(rows).any(axis=1).any():
+                print(f"Warning: Row length mismatch in mixed array for {arrID}")
+            DataFrame = pd.DataFrame({'RECORD':np.arange(1,rows.shape[0]+1)}|{name:rows[:,i] for i,name in enumerate(names) if i>3},
+                index=pd.DatetimeIndex(self.parseDates(rows),name='TIMESTAMP'))
+            variableMap = {'TIMESTAMP':{'units':'TS','variableDescription':''},'RECORD':{'units':'RN','variableDescription':''}}|{
+                name:dict(var) for i,(name,var) in enumerate(arr['variableMap'].items()) if i>3}
+            self.dOuts[arrID] = mixedArrayTable(
+                sourceFile=self.DAT_file,
+                DataFrame=DataFrame,
+                variableMap=variableMap,
+                LoggerModel=self.ArrayDefs['Model'],
+                program=self.ArrayDefs['Program'],
+                Table=arrID,
+                frequency=arr['frequency'],
+                fileType='mixedArray',
+                fileTimestamp=DataFrame.index[-1] if DataFrame.shape[0]>0 else pd.to_datetime(self.ArrayDefs['Timestamp']),
+                verbose=self.verbose,
+                instrument=self.instrument,
+                extract=self.extract
+                )
+            if self.saveTOA5:
+                self.writeTOA5(arrID)
+
+    def firstLast(self,width):
+        # Header-only pass: rows from the start and the end of the file holding the first and last record of every array ID
+        arrayIDs = set(self.ArrayDefs['Table'].keys())
+        seen = lambda lines: {line.split(b',',1)[0].strip().decode('ascii',errors='replace') for line in lines}
+        n = 64
+        while True:
+            with open(self.DAT_file,'rb') as f:
+                head = [line for line in headLines(f,n) if line.endswith(b'\n')]
+            tail = tailLines(self.DAT_file,n)
+            if len(head) < n or len(tail) < n or (arrayIDs <= seen(head) and arrayIDs <= seen(tail)):
+                break
+            n *= 8
+        if len(head) > 0:
+            head[0] = head[0].removeprefix(b'\xef\xbb\xbf')
+        return(pd.read_csv(io.BytesIO(b''.join(head+tail)),header=None,names=range(width),dtype=np.float64).values)
+
+    def parseDates(self,rows):
+        # POSIX timestamps from the Year, Day of year and HourMinute (HHMM) columns
+        year,doy,hourMinute = [rows[:,i].astype(np.int64) for i in range(1,4)]
+        Date = (year-1970).astype('datetime64[Y]').astype('datetime64[D]')+(doy-1)
+        return(Date.astype('datetime64[ns]')+((hourMinute//100)*60+hourMinute%100)*np.timedelta64(1,'m'))
+
+    def writeTOA5(self,arrID):
+        # Write one array ID out as a TOA5 file
+        table = self.dOuts[arrID]
+        sourceFile = self.DAT_file.split('.')[0] + f'_ArrayID{arrID}_{datetime.datetime.now().strftime("%Y_%m_%d_%H%M")}.dat'
+        header = [
+            ['TOA5','',self.ArrayDefs['Model'],'','',self.ArrayDefs['Program'],'',arrID],
+            ['TIMESTAMP']+list(table.DataFrame.columns),
+            ['TS']+[self.ArrayDefs['Table'][arrID]['variableMap'].get(c,{'units':'RN'})['units'] for c in table.DataFrame.columns],
+            ['']+[self.ArrayDefs['Table'][arrID]['variableMap'].get(c,{'variableDescription':''})['variableDescription'] for c in table.DataFrame.columns],
+        ]
+        with open(sourceFile,'w') as f:
+            f.write(''.join([','.join([f'"{h}"' for h in row])+'\n' for row in header]))
+            table.DataFrame.to_csv(f,header=False,date_format='%Y-%m-%d %H:%M:%S',lineterminator='\n')
@@ -1,42 +1,132 @@
 try:
     # relative import for use as submodules
-    from .baseMethods import * 
+    from .baseMethods import *
 except:
     # absolute import for use as standalone
-    from baseMethods import * 
-    
+    from baseMethods import *
+import io
+
+def parseFixedTimestamp(values,timestampFormat,name=None):
+    # Vectorized parser for fixed-width numeric formats (%Y %y %m %d %H %M %S and literal separators, e.g. %y/%m/%d %H:%M:%S)
+    # digits are read straight from the byte matrix of the strings, anything else falls back to pandas
+    fallback = lambda: pd.DatetimeIndex(pd.to_datetime(values,format=timestampFormat),name=name)
+    fields = re.findall(r'%[a-zA-Z]|[^%]',timestampFormat)
+    widths = {'%Y':4,'%y':2,'%m':2,'%d':2,'%H':2,'%M':2,'%S':2}
+    if any(f.startswith('%') and f not in widths for f in fields):
+        return(fallback())
+    text = np.asarray(values).astype('S')
+    width = sum(widths.get(f,1) for f in fields)
+    if text.shape[0] == 0 or text.dtype.itemsize != width or (np.char.str_len(text) != width).any():
+        return(fallback())
+    chars = text.view(np.uint8).reshape(-1,width)
+    parts,position = {'%Y':1970,'%m':1,'%d':1,'%H':0,'%M':0,'%S':0},0
+    for f in fields:
+        if f in widths:
+            digits = chars[:,position:position+widths[f]].astype(np.int64)-48
+            if ((digits<0)|(digits>9)).any():
+                return(fallback())
+            parts[f] = digits@(10**np.arange(widths[f]-1,-1,-1))
+            position += widths[f]
+        else:
+            if (chars[:,position] != ord(f)).any():
+                return(fallback())
+            position += 1
+    if '%y' in parts:
+        # strptime convention: 69-99 are 1900s, 00-68 are 2000s
+        parts['%Y'] = np.where(parts['%y']<69,2000,1900)+parts['%y']
+    month = (parts['%Y']-1970)*12+parts['%m']-1
+    Date = month.astype('datetime64[M]').astype('datetime64[D]')+(parts['%d']-1)
+    valid = ((np.asarray(parts['%m'])-1)%12+1 == parts['%m'])&(Date.astype('datetime64[M]').astype(np.int64) == month)
+    valid &= (np.asarray(parts['%d'])>=1)&(np.asarray(parts['%H'])<24)&(np.asarray(parts['%M'])<60)&(np.asarray(parts['%S'])<62)
+    if not np.all(valid):
+        return(fallback())
+    Timestamp = Date.astype('datetime64[ns]')+((parts['%H']*60+parts['%M'])*60+parts['%S'])*np.timedelta64(1,'s')
+    return(pd.DatetimeIndex(Timestamp,name=name))
+
 @dataclass(kw_only=True)
 class genericCSV(genericLoggerFile):
     timestampName: str #= "TIMESTAMP"
     timestampFormat: str #= "%y/%m/%d %H:%M:%S"
     skiprows: int = 0
     statusCols: list = field(default_factory=lambda:['Host Connected', 'Stopped', 'End Of File'],repr=False)
+    # Read in chunks of chunksize rows, timestamps are parsed and the text columns dropped chunk by chunk
+    chunksize: int = field(default=None,repr=False)
+    statusEvents: pd.DataFrame = field(default=None,repr=False)
 
     def __post_init__(self):
         super().__post_init__()
-        rawFile = open(self.sourceFile,'r',encoding='utf-8-sig')
-        T = []
-        for i in range(self.skiprows):
-            T .append(rawFile.readline().rstrip('\n'))
-
-        self.DataFrame = pd.read_csv(rawFile)
-        # ID the timestamp and parse to datetime index
-        if type(self.timestampName) is str:
-            A = [c==self.timestampName for c in self.DataFrame.columns]
-            B = self.DataFrame.columns.str.contains(self.timestampName)
-            cix = self.DataFrame.columns[[a if a else b for a,b in zip(A,B)]]
-            self.DataFrame.index = pd.to_datetime(self.DataFrame['Date Time, GMT+00:00'],format=self.timestampFormat)
-        elif type(self.timestampName) is list:
-            cix = [False for i in range(len(self.DataFrame.columns))]
-            for t in self.timestampName:
-                cix = [True if cix[i] or self.DataFrame.columns[i] == t else False
-                       for i in range(len(self.DataFrame.columns))]
-            self.DataFrame.index = self.DataFrame[self.DataFrame.columns[cix]].apply(' '.join, axis=1)
-            self.DataFrame.index = pd.to_datetime(self.DataFrame.index,format=self.timestampFormat)
-            self.timestampName = ' '.join(self.DataFrame.columns[cix])
-        self.fileTimestamp = pd.to_datetime(self.DataFrame.index[-1])
+        self.readHeader()
+        self.events = []
+        if self.extract and self.chunksize is None:
+            with self.stage('read',bytes=os.path.getsize(self.sourceFile)) as record:
+                self.DataFrame = self.readChunk(pd.read_csv(self.sourceFile,skiprows=self.skiprows,encoding='utf-8-sig',dtype=self.textCols))
+                record['rows'] = self.DataFrame.shape[0]
+        elif self.extract:
+            self.DataFrame = pd.concat(list(self.readChunks(self.chunksize)))
+        else:
+            # Header-only pass: the column titles with the first two and the last complete rows
+            with self.stage('span'):
+                with open(self.sourceFile,'r',encoding='utf-8-sig') as rawFile:
+                    for i in range(self.skiprows+1):
+                        header = rawFile.readline()
+                    lines = [line for line in headLines(rawFile,2) if line.endswith('\n')]
+                if len(lines) > 0:
+                    last = tailLines(self.sourceFile,1)[0].decode('utf-8',errors='replace')
+                    if last not in lines:
+                        lines.append(last)
+                self.DataFrame = self.readChunk(pd.read_csv(io.StringIO(header+''.join(lines)),dtype=self.textCols))
+            if self.DataFrame.shape[0] > 1:
+                self.frequency = f"{(self.DataFrame.index[1]-self.DataFrame.index[0]).total_seconds()}s"
+                self.DataFrame = self.DataFrame.iloc[[0,-1]]
+        self.statusEvents = pd.concat(self.events) if len(self.events) > 0 else pd.DataFrame(columns=self.statusCols)
+        # The last logger event (e.g. readout), otherwise the last record
+        self.fileTimestamp = pd.to_datetime((self.statusEvents if self.statusEvents.shape[0] > 0 else self.DataFrame).index[-1])
         self.standardize()
-        self.applySafeNames()
+        self.applyvariableNames()
+
+    def readHeader(self):
+        # Locate the timestamp and status columns from the column titles
+        columns = pd.read_csv(self.sourceFile,skiprows=self.skiprows,nrows=0,encoding='utf-8-sig').columns
+        names = [self.timestampName] if type(self.timestampName) is str else list(self.timestampName)
+        self.timestampCols = []
+        for name in names:
+            match = [c for c in columns if c == name] or [c for c in columns if name in c]
+            if len(match) == 0:
+                raise ValueError(f"{self.sourceFile} has no {name} column")
+            self.timestampCols.append(match[0])
+        self.timestampName = ' '.join(self.timestampCols)
+        safe = lambda text: re.sub('[^0-9a-zA-Z]+','_',text)
+        self.statusCols = [c for c in columns if any(safe(s) in safe(c) for s in self.statusCols)]
+        # Timestamp and status columns are read as text so every chunk gets the same dtypes
+        self.textCols = {c:object for c in self.timestampCols+self.statusCols}
+        self.variableMap[self.timestampName] = {'title':self.timestampName}|self.variableMap.get(self.timestampName,{})
+
+    def readChunk(self,DataFrame):
+        # Timestamp index from the timestamp column(s), joined by vectorized string concatenation when there are several
+        # Rows with a status entry are collected in the same pass
+        text = DataFrame[self.timestampCols[0]]
+        if len(self.timestampCols) > 1:
+            text = text.str.cat([DataFrame[c] for c in self.timestampCols[1:]],sep=' ')
+        DataFrame.index = parseFixedTimestamp(text.values,self.timestampFormat,name=self.timestampName)
+        DataFrame = DataFrame.drop(columns=self.timestampCols)
+        if len(self.statusCols) > 0:
+            logged = DataFrame[self.statusCols].notna().to_numpy().any(axis=1)
+            if logged.any():
+                self.events.append(DataFrame.loc[logged,self.statusCols])
+        return(DataFrame)
+
+    def readChunks(self,chunksize):
+        with self.stage('read',bytes=os.path.getsize(self.sourceFile)) as record:
+            record['rows'] = 0
+            for chunk in pd.read_csv(self.sourceFile,skiprows=self.skiprows,encoding='utf-8-sig',dtype=self.textCols,chunksize=chunksize):
+                record['rows'] += chunk.shape[0]
+                yield(self.readChunk(chunk))
+
+    def iter_chunks(self,chunksize=10**6):
+        # Stream the file as renamed DataFrame chunks, use with extract=False to skip the full read
+        # The variableMap is the one built in __post_init__
+        for chunk in self.readChunks(chunksize):
+            yield(self.processChunk(chunk).rename(columns=self.safeMap))
 
 @dataclass(kw_only=True)
 class HOBO(genericCSV):
@@ -46,6 +136,7 @@ class HOBO(genericCSV):
     statusCols: list = field(default_factory=lambda:['Host_Connected', 'Stopped', 'End_Of_File'],repr=False)
 
     def __post_init__(self):
-        super().__post_init__()        
-        self.statusCols = self.DataFrame.columns[self.DataFrame.columns.str.contains('|'.join(self.statusCols))].values
-        self.fileTimestamp = pd.to_datetime(self.DataFrame.index[(self.DataFrame[self.statusCols].isna()==False).any(axis=1).values].values[-1])
\ No newline at end of file
+        super().__post_init__()
+        # Logger serial number from the column titles
+        serial = re.search(r'LGR S/N: ([0-9]+)',' '.join(self.variableMap[v]['title'] or '' for v in self.variableMap))
+        self.SerialNo = serial.group(1) if serial is not None else None
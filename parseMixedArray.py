@@ -86,9 +86,7 @@ class parseMixedArray(Metadata):
             self.mode = 0
             print('Cannot parse without DEF file')
         else:
-            self.f = open(file,'r',encoding='utf-8-sig')
-            self.MA = [l.rstrip('\n').split(',') for l in self.f.readlines()]
-            self.f.close()
+            self.file = file
             self.f = open(DEF,'r',encoding='utf-8-sig')
             self.DEF = self.f.readlines()
             self.f.close()
@@ -180,27 +178,25 @@ class parseMixedArray(Metadata):
         return(freq)
         
     def getData(self):
-        for row in self.MA:
-            for arrID in self.Arrays.keys():
-                if int(row[0]) == int(arrID):
-                    for i in range(len(self.Contents[arrID]['arrayContents'].keys())-len(row)):
-                        row.append(np.nan)
-                    self.Arrays[arrID]['Data'].append(row)
+        # Single pass over the mixed array: one ragged read (short rows padded with NaN),
+        # then rows are grouped by array ID (column 0) into preallocated float32 arrays
+        width = max(len(self.Contents[arrID]['arrayContents']) for arrID in self.Arrays.keys())
+        MA = pd.read_csv(self.file,header=None,names=range(width),encoding='utf-8-sig',
+                         dtype=np.float64,float_precision='round_trip').values
+        arrayIDs = MA[:,0].astype(np.int64)
         for arrID in self.Arrays.keys():
-            self.Arrays[arrID]['Data'] = np.array(self.Arrays[arrID]['Data'],dtype='float32')
-            self.parseDate()
+            rows = arrayIDs == int(arrID)
+            ncols = len(self.Contents[arrID]['arrayContents'].keys())
+            self.Arrays[arrID]['Data'] = np.empty((rows.sum(),ncols),dtype='float32')
+            self.Arrays[arrID]['Data'][:] = MA[rows,:ncols]
+        self.parseDate()
                 
     def parseDate(self):
         # Assumes Year_RMT,Day_RMT,Hour_Minute_RMT as is the default output from shortcut
+        # POSIX timestamps computed arithmetically from year, day of year and HHMM
         for arrID in self.Arrays.keys():
             if sum([k in list(self.Contents[arrID]['arrayContents'].keys()) for k in ['Year_RTM', 'Day_RTM', 'Hour_Minute_RTM']]) != 3:
                 sys.exit('Timestamp format currently not supported.  Should ba a simple fix')
-            Date = self.Arrays[arrID]['Data'][:,1:3].astype(int).astype(str)
-            Date = [' '.join(D) for D in self.Arrays[arrID]['Data'][:,1:3].astype(int).astype(str)]
-            Date = pd.to_datetime(Date,format = '%Y %j')
-
-            Time = self.Arrays[arrID]['Data'][:,3].astype(int).astype(str)
-            Time = [t.zfill(4) for t in Time]
-            Time = [t[0:2]+':'+t[2:]+':'+'00' for t in Time]
-            Time = pd.to_timedelta(Time)
-            self.Arrays[arrID]['Timestamp'] = np.array([x.timestamp() for x in Date+Time])
\ No newline at end of file
+            year,doy,hourMinute = self.Arrays[arrID]['Data'][:,1:4].astype(np.int64).T
+            days = (year-1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)+doy-1
+            self.Arrays[arrID]['Timestamp'] = (days*86400+(hourMinute//100)*3600+(hourMinute%100)*60).astype(np.float64)
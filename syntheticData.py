@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import pandas as pd
+try:
+    # relative import for use as submodules
+    from .parseCSI import decodeFP2
+except:
+    # absolute import for use as standalone
+    from parseCSI import decodeFP2
+
+# Deterministic synthetic logger files for benchmarking and round-trip checks
+# Each writer returns the records a parser should recover from the file it wrote
+
+campbellBaseTime = pd.Timestamp('1990-01-01')
+
+def syntheticValues(rng,nrows,dtype):
+    # Random values that survive the storage type exactly
+    if dtype == 'FP2':
+        # FP2 codes with a valid mantissa (<=7999), decoded the way the logger would
+        sign = rng.integers(0,2,nrows)
+        exponent = rng.integers(0,4,nrows)
+        mantissa = rng.integers(0,8000,nrows)
+        codes = ((sign<<15)|(exponent<<13)|mantissa).astype(np.uint16)
+        return(codes,decodeFP2(codes))
+    if dtype == 'IEEE8B':
+        values = rng.normal(0,100,nrows)
+        return(values,values)
+    values = rng.normal(0,100,nrows).astype(np.float32)
+    return(values,values)
+
+def writeTOB3(sourceFile,nframes=1000,columns=None,frameSize=976,interval='100 MSEC',start='2024-07-01 00:00:00',
+              station='SYNTH',table='Flux_Data',val_stamp=60097,partialFrames=0,corruptFrames=0,seed=0):
+    # TOB3 file with nframes frames, columns is a {name: 'IEEE4B'|'IEEE8B'|'FP2'} map
+    # The last partialFrames frames are only partially filled (nonzero footer offset),
+    # corruptFrames frames get a bad validation stamp and are expected to be dropped
+    rng = np.random.default_rng(seed)
+    if columns is None:
+        columns = {'Ux':'IEEE4B','Uy':'IEEE4B','Uz':'IEEE4B','Ts':'IEEE4B','diag':'FP2','CO2':'FP2','H2O':'IEEE4B','seconds':'IEEE8B'}
+    codes = {'IEEE4B':'>f4','IEEE8B':'>f8','FP2':'>u2'}
+    recordDtype = np.dtype([(name,codes[dtype]) for name,dtype in columns.items()])
+    recordsPerFrame = (frameSize-16)//recordDtype.itemsize
+    step = pd.to_timedelta(interval.replace('MSEC','ms')).total_seconds()
+    nrecords = nframes*recordsPerFrame
+    body = np.zeros(nrecords,dtype=recordDtype)
+    expected = {}
+    for name,dtype in columns.items():
+        body[name],expected[name] = syntheticValues(rng,nrecords,dtype)
+    # Frame headers: seconds since 1990, subseconds in 100 us units, first record number
+    frameStart = (pd.Timestamp(start)-campbellBaseTime).total_seconds()+np.arange(nframes)*recordsPerFrame*step
+    frames = np.zeros(nframes,dtype=np.dtype({
+        'names':['header','body','footer'],
+        'formats':[('<u4',3),(recordDtype,recordsPerFrame),'<u4'],
+        'offsets':[0,12,frameSize-4],
+        'itemsize':frameSize}))
+    frames['header'][:,0] = np.floor(frameStart)
+    frames['header'][:,1] = np.round((frameStart-np.floor(frameStart))*1e4)
+    frames['header'][:,2] = np.arange(nframes)*recordsPerFrame
+    frames['body'] = body.reshape(nframes,recordsPerFrame)
+    keep = np.ones((nframes,recordsPerFrame),dtype=bool)
+    footerOffset = np.zeros(nframes,dtype=np.uint32)
+    for f in range(nframes-partialFrames,nframes):
+        used = rng.integers(1,recordsPerFrame) if recordsPerFrame > 1 else 1
+        footerOffset[f] = frameSize-16-used*recordDtype.itemsize
+        keep[f,used:] = False
+    stamps = np.full(nframes,val_stamp,dtype=np.uint32)
+    if corruptFrames > 0:
+        bad = rng.choice(nframes,corruptFrames,replace=False)
+        stamps[bad] = (val_stamp+1) & 0xFFFF
+        keep[bad] = False
+    frames['footer'] = (stamps<<16)|footerOffset
+    preamble = [
+        ['TOB3',station,'CR1000X','00000','CR1000X.Std.07.02','CPU:synthetic.CR1X','00000',start],
+        [table,interval,str(frameSize),str(nrecords),str(val_stamp),'Sec100Usec','0','0','0'],
+        list(columns.keys()),
+        ['']*len(columns),
+        ['Smp']*len(columns),
+        list(columns.values()),
+    ]
+    with open(sourceFile,'wb') as f:
+        f.write(''.join([','.join([f'"{p}"' for p in line])+'\r\n' for line in preamble]).encode('ascii'))
+        frames.tofile(f)
+    keep = keep.ravel()
+    index = campbellBaseTime+pd.to_timedelta(np.repeat(frameStart,recordsPerFrame)+np.tile(np.arange(recordsPerFrame)*step,nframes),unit='s')
+    return(pd.DataFrame({name:values[keep] for name,values in expected.items()},index=index[keep].round(f"{step}s")))
+
+def writeTOA5(sourceFile=None,nrows=10000,columns=None,interval='100ms',start='2024-07-01 00:00:00',
+              station='SYNTH',table='FLUX',outputPath='.',seed=0):
+    # TOA5 file, sourceFile defaults to a name carrying the CardConvert timestamp the header parser expects
+    rng = np.random.default_rng(seed)
+    if columns is None:
+        columns = ['Ux','Uy','Uz','Ts','CO2','H2O','press']
+    if sourceFile is None:
+        sourceFile = os.path.join(outputPath,f"TOA5_{station}.{table}_{pd.Timestamp(start).strftime('%Y_%m_%d_%H%M')}.dat")
+    index = pd.date_range(start,periods=nrows,freq=interval,name='TIMESTAMP')
+    DataFrame = pd.DataFrame({'RECORD':np.arange(nrows,dtype=np.int64)}|{c:np.round(rng.normal(0,100,nrows),5) for c in columns},index=index)
+    header = [
+        ['TOA5',station,'CR1000','00000','CR1000.Std.30.01','CPU:synthetic.cr1','00000',table],
+        ['TIMESTAMP','RECORD']+columns,
+        ['TS','RN']+['']*len(columns),
+        ['','']+['Smp']*len(columns),
+    ]
+    with open(sourceFile,'w') as f:
+        f.write(''.join([','.join([f'"{h}"' for h in line])+'\n' for line in header]))
+        DataFrame.to_csv(f,header=False,date_format='%Y-%m-%d %H:%M:%S.%f',lineterminator='\n')
+    return(sourceFile,DataFrame)
+
+def writeHOBO(sourceFile,nrows=10000,nsensors=4,interval='30min',start='2024-07-20 21:00:00',serial='20750528',seed=0):
+    # HOBOware csv export: plot title row, column titles, then numbered rows with empty status columns except the last row
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start,periods=nrows,freq=interval)
+    names = [f'Temp, °C (LGR S/N: {serial}, SEN S/N: {serial}, LBL: {i})' for i in range(nsensors)]
+    DataFrame = pd.DataFrame({n:np.round(rng.normal(0,10,nrows),3) for n in names},index=index)
+    status = [f'{s} (LGR S/N: {serial})' for s in ['Host Connected','Stopped','End Of File']]
+    with open(sourceFile,'w',encoding='utf-8-sig') as f:
+        f.write(f'"Plot Title: {serial}"\n')
+        f.write(','.join([f'"{c}"' for c in ['#','Date Time, GMT+00:00']+names+status])+'\n')
+        for i,(t,row) in enumerate(zip(index.strftime('%y/%m/%d %H:%M:%S'),DataFrame.values)):
+            flags = ',,,' if i < nrows-1 else ',Logged,Logged,Logged'
+            f.write(f"{i+1},{t},"+','.join(map(str,row))+flags+'\n')
+    return(DataFrame)
+
+def writeMixedArray(DAT_file,DEF_file,nrows=10000,arrayID=101,start='2024-09-14 18:00:00',seed=0):
+    # Mixed array .dat and its Short Cut .DEF file with a half-hourly output table
+    rng = np.random.default_rng(seed)
+    names = ['BattV_AVG','AirTC_AVG','RH','Pressure_AVG']
+    index = pd.date_range(start,periods=nrows,freq='30min')
+    DataFrame = pd.DataFrame({n:np.round(rng.normal(0,10,nrows),3) for n in names},index=index)
+    with open(DEF_file,'w') as f:
+        f.write(f"{pd.Timestamp(start).strftime('%m/%d/%Y')}\n{pd.Timestamp(start).strftime('%H:%M:%S')}\n")
+        f.write("Created by Short Cut (4.4)\nShort Cut Program:  synthetic.DEF\n\n-Wiring for CR10X-\n\n")
+        f.write(f"{arrayID} Output_Table  30.00 Min\n1 {arrayID} L\n2 Year_RTM  L\n3 Day_RTM  L\n4 Hour_Minute_RTM  L\n")
+        f.write(''.join([f"{i+5} {n}  L\n" for i,n in enumerate(names)])+'\n')
+    with open(DAT_file,'w') as f:
+        for t,row in zip(index,DataFrame.values):
+            f.write(f"{arrayID},{t.year},{t.dayofyear},{t.hour*100+t.minute},"+','.join(map(str,row))+'\n')
+    return(DataFrame)